@@ -5,6 +5,12 @@ from ocplot.plotting import *
 from ocplot.stack_coloring import *
 from ocplot.axes_utils import *
 from ocplot.contours import *
+from ocplot.profiling import profile_helpers
+from ocplot.handles import ArtistHandle
+from ocplot.streaming import StreamingColorPlot
+from ocplot.stats import bootstrap_ci, permutation_tests
+from ocplot.export import export_colored_stack
+from ocplot.batch import *
 
 """
 from matplotlib import pyplot as plt
@@ -4,7 +4,11 @@ from matplotlib import pyplot as plt
 from mpl_toolkits.axes_grid1.inset_locator import inset_axes
 from skimage import measure
 
+from ocplot.handles import ArtistHandle
+from ocplot.profiling import profiled
 
+
+@profiled
 def add_cbar(
     ref_plot,
     ax,
@@ -21,8 +25,8 @@ def add_cbar(
 
     Parameters
     ----------
-    ref_plot : matplotlib object accepting a colormap.
-        The imshow/scatterplot to add the cmap to.
+    ref_plot : matplotlib object accepting a colormap, or ArtistHandle.
+        The imshow/scatterplot (or handle from an ocplot helper) to add the cmap to.
     ax : Axis
         Either the axes to be used for plotting (if no inset_loc passed), or the axes
         relative to which to compute the position of the inset plot.
@@ -47,6 +51,9 @@ def add_cbar(
         matplotlib Colorbar obj
 
     """
+    if isinstance(ref_plot, ArtistHandle):
+        ref_plot = ref_plot.artist
+
     if inset_loc is not None:
         col_ax = inset_axes(
             ax,
@@ -55,13 +62,13 @@ def add_cbar(
             bbox_to_anchor=inset_loc,
             bbox_transform=ax.transAxes,
         )
-        # col_ax = plt.gcf().add_axes(col_ax)
     else:
         col_ax = ax
 
-    cbar = plt.colorbar(ref_plot, cax=col_ax, **kwargs)
+    cbar = col_ax.figure.colorbar(ref_plot, cax=col_ax, **kwargs)
     cbar.ax.set_title(title, fontsize=titlesize)
-    cbar.set_ticks(ticks)
+    if ticks is not None:
+        cbar.set_ticks(ticks)
 
     if not tick_visible:
         cbar.ax.tick_params(size=0.0)
@@ -75,6 +82,69 @@ def add_cbar(
     return cbar
 
 
+@profiled
+def add_bivariate_legend(
+    lut,
+    ax,
+    inset_loc=None,
+    vlims_a=(0, 1),
+    vlims_b=(0, 1),
+    label_a="",
+    label_b="",
+    labelsize=8,
+):
+    """Add a 2D legend for a bivariate lookup table (see `get_bivariate_lut`).
+
+    Parameters
+    ----------
+    lut : np.array
+        (n_a, n_b, 4) lookup table.
+    ax : Axis
+        Either the axes to be used for plotting (if no inset_loc passed), or the axes
+        relative to which to compute the position of the inset plot.
+    inset_loc : tuple (optional)
+        Position of the legend inset, relative to ax (default=None).
+    vlims_a : tuple (optional)
+        Limits of the first variable, shown on the x axis (default=(0, 1)).
+    vlims_b : tuple (optional)
+        Limits of the second variable, shown on the y axis (default=(0, 1)).
+    label_a : str (optional)
+        Label of the first variable (default="").
+    label_b : str (optional)
+        Label of the second variable (default="").
+    labelsize : int (optional)
+        Specify fontsize of tick labels and labels (default=8).
+
+    Returns
+    -------
+        matplotlib Axes of the legend
+
+    """
+    if inset_loc is not None:
+        legend_ax = inset_axes(
+            ax,
+            width="100%",
+            height="100%",
+            bbox_to_anchor=inset_loc,
+            bbox_transform=ax.transAxes,
+        )
+    else:
+        legend_ax = ax
+
+    legend_ax.imshow(
+        np.swapaxes(lut, 0, 1),
+        extent=tuple(vlims_a) + tuple(vlims_b),
+        origin="lower",
+        aspect="auto",
+        interpolation="nearest",
+    )
+    legend_ax.set_xlabel(label_a, fontsize=labelsize)
+    legend_ax.set_ylabel(label_b, fontsize=labelsize)
+    legend_ax.tick_params(labelsize=labelsize)
+
+    return legend_ax
+
+
 def despine(ax, sides=("right", "top"), rmticks=True):
     if sides == "all":
         sides = ["right", "top", "left", "bottom"]
@@ -88,6 +158,7 @@ def despine(ax, sides=("right", "top"), rmticks=True):
     [ax.axes.spines[s].set_visible(False) for s in sides]
 
 
+@profiled
 def add_scalebar(
     ax=None,
     xlen=None,
@@ -197,3 +268,23 @@ def add_scalebar(
 
     if disable_axis:
         despine(ax, "all")
+
+
+def set_rasterized(artists, rasterize=True):
+    """Set rasterization of dense artists when saving to vector formats (pdf, svg).
+    All other elements of the figure (axes, text, scalebars) will stay vector.
+
+    The resolution of the rasterized artists is set by the `dpi` argument of
+    savefig, and their stacking with the vector elements by their zorder.
+
+    Parameters
+    ----------
+    artists : list of matplotlib artists
+        Artists to rasterize.
+    rasterize : bool
+        If True, artists are rasterized (default=True).
+
+    """
+    if rasterize:
+        for artist in artists:
+            artist.set_rasterized(True)
@@ -0,0 +1,299 @@
+"""Tools to generate figures without relying on the pyplot global state, so that
+they can be safely produced in threads or in a pool of worker processes, and to
+color many datasets in parallel.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from ocplot.color_utils import get_categorical_color_scheme
+from ocplot.export import export_colored_stack
+from ocplot.stack_coloring import color_stack
+
+
+def new_figure(figsize=None, dpi=None, **kwargs):
+    """Create a figure with an Agg canvas, detached from pyplot.
+
+    Figures created this way are not registered in the pyplot figure manager, so
+    they do not need to be closed and can be created from any thread.
+
+    Parameters
+    ----------
+    figsize : tuple (optional)
+        Figure size in inches (default=matplotlib default).
+    dpi : float (optional)
+        Figure resolution (default=matplotlib default).
+    kwargs : dict
+        Additional arguments for the matplotlib Figure.
+
+    Returns
+    -------
+    matplotlib Figure
+
+    """
+    fig = Figure(figsize=figsize, dpi=dpi, **kwargs)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def save_figure(fig, filename, formats=None, **kwargs):
+    """Save a figure to one or more formats.
+
+    Parameters
+    ----------
+    fig : matplotlib Figure
+        Figure to save.
+    filename : str or Path
+        Output file. If `formats` is passed, the extension is replaced by each of
+        the formats.
+    formats : list of str (optional)
+        Formats in which the figure is saved, eg ("png", "pdf") (default=None).
+    kwargs : dict
+        Additional arguments for Figure.savefig.
+
+    Returns
+    -------
+    list of str
+        Saved files.
+
+    """
+    filename = str(filename)
+    if formats is None:
+        filenames = [filename]
+    else:
+        root = os.path.splitext(filename)[0]
+        filenames = [f"{root}.{fmt}" for fmt in formats]
+
+    for fname in filenames:
+        fig.savefig(fname, **kwargs)
+
+    return filenames
+
+
+def render_figure(spec):
+    """Render and save a single figure from a spec dictionary.
+
+    Parameters
+    ----------
+    spec : dict
+        Figure specification, with keys:
+            - draw_fun: function with signature draw_fun(fig, **draw_kwargs) that
+                populates the figure. It has to be picklable (eg, defined at
+                the module level) to be used with `render_figures`.
+            - filename: output file.
+            - draw_kwargs (optional): arguments for draw_fun.
+            - figsize, dpi (optional): arguments for `new_figure`.
+            - formats (optional): formats in which the figure is saved.
+            - savefig_kwargs (optional): arguments for Figure.savefig.
+
+    Returns
+    -------
+    list of str
+        Saved files.
+
+    """
+    fig = new_figure(figsize=spec.get("figsize"), dpi=spec.get("dpi"))
+    spec["draw_fun"](fig, **spec.get("draw_kwargs", {}))
+
+    return save_figure(
+        fig,
+        spec["filename"],
+        formats=spec.get("formats"),
+        **spec.get("savefig_kwargs", {}),
+    )
+
+
+def render_figures(specs, n_workers=None, chunksize=1):
+    """Render many figures in parallel over a pool of processes.
+
+    Parameters
+    ----------
+    specs : list of dict
+        List of figure specifications (see `render_figure`).
+    n_workers : int (optional)
+        Number of worker processes. If 1, figures are rendered serially in the
+        current process (default=number of cores).
+    chunksize : int (optional)
+        Number of specs sent to each worker at once (default=1).
+
+    Returns
+    -------
+    list of str
+        Saved files, for all figures.
+
+    """
+    if n_workers == 1:
+        results = [render_figure(spec) for spec in specs]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            results = list(executor.map(render_figure, specs, chunksize=chunksize))
+
+    return [fname for filenames in results for fname in filenames]
+
+
+def _share_array(array):
+    """Copy an array in a new shared memory block.
+
+    Returns
+    -------
+    SharedMemory, tuple
+        The shared memory block (to be closed and unlinked by the caller) and the
+        (name, shape, dtype) description used to attach to it.
+
+    """
+    from multiprocessing.shared_memory import SharedMemory  # python >= 3.8
+
+    shm = SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def _attach_array(description):
+    """Attach to an array shared with `_share_array`, without copying it."""
+    from multiprocessing.shared_memory import SharedMemory  # python >= 3.8
+
+    name, shape, dtype = description
+    try:
+        # Attached blocks should not be tracked (and unlinked) by the workers:
+        shm = SharedMemory(name=name, track=False)
+    except TypeError:  # python < 3.13
+        shm = SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _color_dataset(job):
+    """Color a single dataset in a worker process, reading the shared palette and
+    anatomy from shared memory."""
+    rois, variable, anatomy, filename, shared, kwargs = job
+
+    shms, arrays = dict(), dict()
+    for key, description in shared.items():
+        shms[key], arrays[key] = _attach_array(description)
+    try:
+        if "palette_keys" in arrays:
+            colors = arrays["palette_colors"].copy()
+            kwargs["color_scheme"] = {
+                k: colors[i] for i, k in enumerate(arrays["palette_keys"])
+            }
+        if "anatomy" in arrays:
+            anatomy = arrays["anatomy"]
+
+        if filename is None:
+            return color_stack(rois, variable, anatomy=anatomy, **kwargs)
+        return export_colored_stack(
+            filename, rois, variable, anatomy=anatomy, n_threads=1, **kwargs
+        )
+    finally:
+        # Views on the shared buffers have to be released before closing them:
+        anatomy, arrays = None, None
+        for shm in shms.values():
+            shm.close()
+
+
+def color_datasets(
+    rois,
+    variables,
+    anatomy=None,
+    filenames=None,
+    categorical=None,
+    n_workers=None,
+    lum=60,
+    sat=60,
+    hshift=0,
+    **kwargs,
+):
+    """Color many datasets with consistent colors, in a pool of processes.
+
+    For categorical variables, a single palette is computed from the categories
+    of all datasets; for continuous variables, color limits are computed from all
+    datasets (unless `vlims` is passed). Palette and shared anatomy are passed to
+    the workers through shared memory.
+
+    Parameters
+    ----------
+    rois : list of 3D np.array
+        Stack of ROIs of each dataset (fimpy convention: -1 in empty voxels).
+    variables : list of 1D np.array
+        Variable for the coloring of each dataset (see `color_stack`).
+    anatomy : 3D np.array or list of 3D np.array (optional)
+        Either a single anatomy (eg, a template) for all datasets, shared between
+        workers, or a list with the anatomy of each dataset (default=None).
+    filenames : list of str (optional)
+        If passed, each colored dataset is written to its file instead of being
+        returned (see `export_colored_stack` for formats) (default=None).
+    categorical : bool (optional)
+        If true, variables will be treated as categorical (normally inferred
+        from the variables).
+    n_workers : int (optional)
+        Number of worker processes (default=number of cores).
+    lum, sat, hshift : int (optional)
+        Luminance, saturation and hue shift of the categorical palette (see
+        `get_n_isoluminant_colors`).
+    kwargs : dict
+        Additional arguments for `color_stack`.
+
+    Returns
+    -------
+    list
+        Colored stack, or written file, for each dataset.
+
+    Notes
+    -----
+    Requires python >= 3.8, for shared memory.
+
+    """
+    bivariate = isinstance(variables[0], tuple)
+    if categorical is None:
+        categorical = not bivariate and np.issubdtype(
+            np.asarray(variables[0]).dtype, np.integer
+        )
+
+    # Workers should not infer it again from their own dataset:
+    kwargs["categorical"] = categorical
+
+    to_share = dict()
+    if categorical:
+        color_scheme = kwargs.pop("color_scheme", None)
+        if color_scheme is None:
+            color_scheme = get_categorical_color_scheme(
+                variables, lum=lum, sat=sat, hshift=hshift
+            )
+        to_share["palette_keys"] = np.array(list(color_scheme.keys()))
+        to_share["palette_colors"] = np.array(list(color_scheme.values()))
+    elif kwargs.get("vlims") is None:
+        all_values = [
+            np.concatenate([np.asarray(v, dtype=float) for v in values])
+            for values in (zip(*variables) if bivariate else [variables])
+        ]
+        vlims = [(np.nanmin(values), np.nanmax(values)) for values in all_values]
+        kwargs["vlims"] = tuple(vlims) if bivariate else vlims[0]
+
+    if anatomy is None or isinstance(anatomy, np.ndarray):
+        if anatomy is not None:
+            to_share["anatomy"] = anatomy
+        anatomy = [None] * len(rois)
+    if filenames is None:
+        filenames = [None] * len(rois)
+
+    shared_blocks = dict()
+    try:
+        shared = dict()
+        for key, array in to_share.items():
+            shared_blocks[key], shared[key] = _share_array(array)
+
+        jobs = [
+            (dataset_rois, variable, dataset_anatomy, filename, shared, kwargs)
+            for dataset_rois, variable, dataset_anatomy, filename in zip(
+                rois, variables, anatomy, filenames
+            )
+        ]
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            return list(executor.map(_color_dataset, jobs))
+    finally:
+        for shm in shared_blocks.values():
+            shm.close()
+            shm.unlink()
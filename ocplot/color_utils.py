@@ -5,6 +5,7 @@ and motions.color.
 import colorspacious
 import matplotlib
 import numpy as np
+from matplotlib import pyplot as plt
 from matplotlib.colors import to_rgb
 
 
@@ -41,19 +42,47 @@ def get_n_isoluminant_colors(n_colors, lum=60, sat=60, hshift=0):
     )
 
 
+def get_categorical_color_scheme(variables, lum=60, sat=60, hshift=0):
+    """Make a categorical color scheme from the values of one or more variables, so
+    that the same category gets the same color across datasets.
+
+    Parameters
+    ----------
+    variables : list of np.array
+        Categorical variables (negative values are excluded).
+    lum : int
+        Luminance of the colors, from 0 to 100 (default=60).
+    sat : int
+        Saturation of the colors, from 0 to 100 (default=60).
+    hshift : int
+        Hue shift, from 0 to 360 (default=0).
+
+    Returns
+    -------
+    dict
+        Mapping [category] = np.array([r, g, b]).
+
+    """
+    unique_vals = np.unique(
+        np.concatenate([np.unique(v[v >= 0]) for v in map(np.asarray, variables)])
+    )
+    colors = get_n_isoluminant_colors(len(unique_vals), lum=lum, sat=sat, hshift=hshift)
+    return {v: colors[i] for i, v in enumerate(unique_vals)}
+
+
 def _get_categorical_colors(variable, color_scheme=None, lum=60, sat=60, hshift=0):
     if color_scheme is None:
-        unique_vals = np.unique(variable[variable >= 0])
-        colors = get_n_isoluminant_colors(
-            len(unique_vals), lum=lum, sat=sat, hshift=hshift
+        color_scheme = get_categorical_color_scheme(
+            [variable], lum=lum, sat=sat, hshift=hshift
         )
-        color_scheme = {v: colors[i] for i, v in enumerate(unique_vals)}
 
     color_scheme[-1] = np.array([0, 0, 0])
 
     roi_colors = np.array([color_scheme[v] for v in variable])
 
-    return np.concatenate([roi_colors, np.full((len(variable), 1), 255)], 1)
+    return np.concatenate([roi_colors, np.full((len(variable), 1), 255)], 1).astype(
+        np.uint8
+    )
 
 
 def get_continuous_colors(variable, color_scheme=None, vlims=None):
@@ -64,11 +93,100 @@ def get_continuous_colors(variable, color_scheme=None, vlims=None):
         vlims = np.nanmin(variable), np.nanmax(variable)
 
     # cmap function:
-    cmap_fun = (
-        color_scheme if callable(color_scheme) else matplotlib.cm.get_cmap(color_scheme)
-    )
+    cmap_fun = color_scheme if callable(color_scheme) else plt.get_cmap(color_scheme)
 
     # normalization function:
     norm = matplotlib.colors.Normalize(vmin=vlims[0], vmax=vlims[1])
 
-    return (np.array([cmap_fun(norm(v)) for v in variable]) * 255).astype(np.uint8)
+    return (cmap_fun(norm(np.asarray(variable))) * 255).astype(np.uint8)
+
+
+def get_bivariate_lut(n_a=64, n_b=64, lum=(85, 50), sat=(0, 50), hshift=90):
+    """Make a 2D color lookup table to map two variables, with hue changing with the
+    first (eg, a phase, on an isoluminant color circle as COLS["phase"]) and
+    lightness and saturation changing with the second (eg, an amplitude).
+
+    Parameters
+    ----------
+    n_a : int
+        Number of colors along the first variable (default=64).
+    n_b : int
+        Number of colors along the second variable (default=64).
+    lum : tuple
+        Luminance for the lowest and highest value of the second variable, from
+        0 to 100 (default=(85, 50)).
+    sat : tuple
+        Saturation for the lowest and highest value of the second variable, from
+        0 to 100 (default=(0, 50)).
+    hshift : int
+        Hue shift, from 0 to 360 (default=90).
+
+    Returns
+    -------
+    np.array
+        (n_a, n_b, 4) uint8 lookup table.
+
+    """
+    steps_b = np.linspace(0, 1, n_b)
+    jch = np.stack(
+        np.broadcast_arrays(
+            (lum[0] + (lum[1] - lum[0]) * steps_b)[np.newaxis, :],
+            (sat[0] + (sat[1] - sat[0]) * steps_b)[np.newaxis, :],
+            (-np.linspace(0, 360, n_a, endpoint=False) + hshift)[:, np.newaxis],
+        ),
+        -1,
+    )
+    rgb = _jch_to_rgb255(jch.reshape(-1, 3)).reshape(n_a, n_b, 3)
+
+    return np.concatenate([rgb, np.full((n_a, n_b, 1), 255, dtype=np.uint8)], -1)
+
+
+def _lut_indexes(variable, n_bins, vlims=None, cyclic=False):
+    variable = np.asarray(variable, dtype=float)
+    if vlims is None:
+        vlims = np.nanmin(variable), np.nanmax(variable)
+
+    normalized = (variable - vlims[0]) / (vlims[1] - vlims[0])
+    indexes = np.floor(np.nan_to_num(normalized) * n_bins).astype(int)
+    if cyclic:
+        return indexes % n_bins
+    return np.clip(indexes, 0, n_bins - 1)
+
+
+def get_bivariate_colors(
+    variable_a, variable_b, color_scheme=None, vlims_a=None, vlims_b=None, cyclic_a=True
+):
+    """Get colors for two variables from a 2D lookup table.
+
+    Parameters
+    ----------
+    variable_a : np.array
+        First variable, mapped on the first axis of the lookup table.
+    variable_b : np.array
+        Second variable, mapped on the second axis of the lookup table.
+    color_scheme : np.array (optional)
+        (n_a, n_b, 4) lookup table (default=get_bivariate_lut()).
+    vlims_a : tuple (optional)
+        Limits for the first variable (default=variable range).
+    vlims_b : tuple (optional)
+        Limits for the second variable (default=variable range).
+    cyclic_a : bool (optional)
+        If True, the first variable is cyclic (eg, a phase), and values out of the
+        limits wrap around (default=True).
+
+    Returns
+    -------
+    np.array
+        (n, 4) uint8 array of colors (zeros where either variable is nan).
+
+    """
+    if color_scheme is None:
+        color_scheme = get_bivariate_lut()
+
+    colors = color_scheme[
+        _lut_indexes(variable_a, color_scheme.shape[0], vlims_a, cyclic=cyclic_a),
+        _lut_indexes(variable_b, color_scheme.shape[1], vlims_b),
+    ]
+    colors[np.isnan(variable_a) | np.isnan(variable_b)] = 0
+
+    return colors
@@ -1,7 +1,16 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
 import numpy as np
 import pandas as pd
 from matplotlib import pyplot as plt
-from skimage.measure import find_contours
+from scipy.ndimage import find_objects
+from skimage.measure import find_contours, marching_cubes
+
+from ocplot.axes_utils import set_rasterized
+from ocplot.profiling import profiled
 
 
 def smooth(coords, wnd=7):
@@ -19,10 +28,273 @@ def projection_contours(img, smooth_wnd=7, thr=0.5, size_threshold=40):
     ]
 
 
-def plot_projection(mask, i, smooth_wnd=7, resolution=0.5, ax=None, **kwargs):
+def _laplacian_smooth(verts, faces, n_iter=10, lam=0.5):
+    """Move each vertex towards the mean of its neighbours, n_iter times."""
+    edges = np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]])
+    edges = np.concatenate([edges, edges[:, ::-1]])
+    n_neighbours = np.maximum(np.bincount(edges[:, 0], minlength=len(verts)), 1)
+
+    for _ in range(n_iter):
+        neighbours_mean = np.stack(
+            [
+                np.bincount(edges[:, 0], verts[edges[:, 1], d], minlength=len(verts))
+                for d in range(verts.shape[1])
+            ],
+            1,
+        )
+        verts = verts + lam * (neighbours_mean / n_neighbours[:, None] - verts)
+    return verts
+
+
+def _sorted_unique_rows(rows):
+    """Sorting order of the rows of an integer array, and mask of the sorted rows
+    that differ from the previous one (faster than np.unique with axis)."""
+    order = np.lexsort(rows.T)
+    sorted_rows = rows[order]
+    is_first = np.ones(len(rows), dtype=bool)
+    is_first[1:] = np.any(sorted_rows[1:] != sorted_rows[:-1], 1)
+    return order, is_first
+
+
+def _cluster_vertices(verts, faces, cell_size):
+    """Decimate a mesh by merging all vertices in the same cell of a grid, and
+    removing the faces that collapse."""
+    cells = np.floor((verts - verts.min(0)) / cell_size).astype(np.int64)
+    order, is_first = _sorted_unique_rows(cells)
+    cluster = np.empty(len(cells), dtype=np.int64)
+    cluster[order] = np.cumsum(is_first) - 1
+    counts = np.bincount(cluster)
+    new_verts = np.stack(
+        [np.bincount(cluster, verts[:, d]) for d in range(verts.shape[1])], 1
+    )
+    new_verts /= counts[:, None]
+
+    new_faces = cluster[faces]
+    new_faces = new_faces[
+        (new_faces[:, 0] != new_faces[:, 1])
+        & (new_faces[:, 1] != new_faces[:, 2])
+        & (new_faces[:, 2] != new_faces[:, 0])
+    ]
+    # Drop duplicated faces, regardless of the order of their vertices:
+    order, is_first = _sorted_unique_rows(np.sort(new_faces, 1))
+    new_faces = new_faces[np.sort(order[is_first])]
+
+    # Drop vertices not used by any face:
+    used, new_faces = np.unique(new_faces, return_inverse=True)
+    return new_verts[used], new_faces.reshape(-1, 3)
+
+
+def decimate_mesh(verts, faces, n_faces, n_iter=20):
+    """Decimate a mesh to at most n_faces faces by vertex clustering, with the
+    finest clustering grid that satisfies the target, found by bisection.
+
+    Parameters
+    ----------
+    verts : (n, 3) np.array
+        Mesh vertices.
+    faces : (m, 3) np.array
+        Mesh faces, as indexes of the vertices.
+    n_faces : int
+        Maximum number of faces of the decimated mesh.
+    n_iter : int
+        Number of bisection steps on the size of the grid (default=20).
+
+    Returns
+    -------
+    np.array, np.array
+        Vertices and faces of the decimated mesh.
+
+    """
+    if len(faces) <= n_faces:
+        return verts, faces
+
+    low, high = 0, np.ptp(verts, 0).max()
+    decimated = _cluster_vertices(verts, faces, high)
+    for _ in range(n_iter):
+        cell_size = (low + high) / 2
+        candidate = _cluster_vertices(verts, faces, cell_size)
+        if len(candidate[1]) <= n_faces:
+            high, decimated = cell_size, candidate
+        else:
+            low = cell_size
+    return decimated
+
+
+def _mesh_cache_file(cache_dir, mask, offset, params):
+    """Cache file for the mesh of a mask, keyed by a hash of its content, position
+    and of the mesh parameters."""
+    key = hashlib.sha1(np.ascontiguousarray(mask, dtype=bool).tobytes())
+    key.update(repr((mask.shape, tuple(offset), params)).encode())
+    return Path(cache_dir) / f"mesh_{key.hexdigest()}.npz"
+
+
+def _mask_mesh(mask, offset, step, smooth_iter, n_faces, cache_dir):
+    """Mesh of a (cropped) mask, with vertices shifted by offset."""
+    params = (step, smooth_iter, n_faces)
+    if cache_dir is not None:
+        cache_file = _mesh_cache_file(cache_dir, mask, offset, params)
+        if cache_file.exists():
+            with np.load(cache_file) as cached:
+                return cached["verts"], cached["faces"]
+
+    # Pad to close surfaces at the borders:
+    padded = np.pad(mask[::step, ::step, ::step], 1).astype(np.float32)
+    if padded.max() == 0:
+        verts, faces = np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64)
+    else:
+        verts, faces, _, _ = marching_cubes(padded, 0.5, allow_degenerate=False)
+        verts = (verts - 1) * step + np.asarray(offset)
+        if smooth_iter > 0:
+            verts = _laplacian_smooth(verts, faces, n_iter=smooth_iter)
+        if n_faces is not None:
+            verts, faces = decimate_mesh(verts, faces, n_faces)
+
+    if cache_dir is not None:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first, so that concurrent jobs sharing the
+        # cache never read a partially written mesh:
+        fd, tmp_file = tempfile.mkstemp(suffix=".npz", dir=cache_file.parent)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, verts=verts, faces=faces)
+            os.replace(tmp_file, cache_file)
+        except BaseException:
+            os.remove(tmp_file)
+            raise
+    return verts, faces
+
+
+def mask_mesh(
+    mask, step=1, smooth_iter=10, n_faces=None, resolution=1, crop=True, cache_dir=None
+):
+    """Find the surface mesh of a 3D mask with marching cubes, smooth it and
+    decimate it.
+
+    Parameters
+    ----------
+    mask : 3D np.array
+        Binary mask.
+    step : int
+        Downsampling factor of the mask before marching cubes (default=1).
+    smooth_iter : int
+        Iterations of Laplacian smoothing of the vertices (default=10).
+    n_faces : int (optional)
+        Maximum number of faces of the mesh, reached by decimation
+        (default=None, no decimation).
+    resolution : float or 3 elements tuple
+        Scaling factor for the vertex coordinates (default=1).
+    crop : bool
+        If True, the mask is cropped to its bounding box first (default=True).
+    cache_dir : str or Path (optional)
+        If passed, meshes are saved in this folder and loaded again when the same
+        mask is meshed with the same parameters (default=None).
+
+    Returns
+    -------
+    np.array, np.array
+        (n, 3) vertices, in voxel coordinates of the mask scaled by resolution,
+        and (m, 3) faces, as indexes of the vertices.
+
+    """
+    offset = (0, 0, 0)
+    if crop:
+        bbox = find_objects(mask.astype(np.int8))
+        if len(bbox) > 0:
+            offset = tuple(s.start for s in bbox[0])
+            mask = mask[bbox[0]]
+
+    verts, faces = _mask_mesh(mask, offset, step, smooth_iter, n_faces, cache_dir)
+    return verts * np.asarray(resolution), faces
+
+
+def label_meshes(
+    labels,
+    label_ids=None,
+    step=1,
+    smooth_iter=10,
+    n_faces=None,
+    resolution=1,
+    cache_dir=None,
+):
+    """Find the surface meshes of many labels of a 3D stack (eg, regions of an
+    atlas), meshing each label only within its bounding box.
+
+    Parameters
+    ----------
+    labels : 3D np.array
+        Stack of integer labels (fimpy convention: -1 in empty voxels).
+    label_ids : list of int (optional)
+        Labels to mesh (default=all labels in the stack).
+    step, smooth_iter, n_faces, resolution, cache_dir :
+        Meshing parameters, applied to each label (see `mask_mesh`).
+
+    Returns
+    -------
+    dict
+        Dictionary of label: (vertices, faces).
+
+    """
+    # Label l is at position l of the output of find_objects for labels + 1:
+    bboxes = find_objects(labels + 1)
+    if label_ids is None:
+        label_ids = [i for i, bbox in enumerate(bboxes) if bbox is not None]
+
+    meshes = dict()
+    for label_id in label_ids:
+        if label_id >= len(bboxes) or bboxes[label_id] is None:
+            continue
+        bbox = bboxes[label_id]
+        verts, faces = _mask_mesh(
+            labels[bbox] == label_id,
+            tuple(s.start for s in bbox),
+            step,
+            smooth_iter,
+            n_faces,
+            cache_dir,
+        )
+        meshes[label_id] = (verts * np.asarray(resolution), faces)
+
+    return meshes
+
+
+@profiled
+def plot_projection(
+    mask, i, smooth_wnd=7, resolution=0.5, ax=None, rasterize=False, **kwargs
+):
+    """Plot filled outlines of the projection of a 3D mask along an axis.
+
+    Parameters
+    ----------
+    mask : 3D np.array
+        Binary mask.
+    i : int
+        Axis along which the mask is projected.
+    smooth_wnd : int
+        Window for the smoothing of the contours (default=7).
+    resolution : float
+        Scaling factor for the contour coordinates (default=0.5).
+    ax : plt.Axes
+        Axes on which to plot (default=current).
+    rasterize : bool
+        If True, the fills are rasterized when saving to vector formats
+        (default=False).
+    kwargs : dict
+        Additional arguments for the plt.fill function.
+
+    Returns
+    -------
+    list of Polygon
+        The filled outlines.
+
+    """
     if ax is None:
         ax = plt.gca()
     contours = projection_contours(mask.max(i), smooth_wnd=smooth_wnd)
+    polygons = []
     for contour in contours:
         contour *= resolution
-        ax.fill(contour[:, 1], contour[:, 0], **kwargs)
+        polygons += ax.fill(contour[:, 1], contour[:, 0], **kwargs)
+
+    set_rasterized(polygons, rasterize)
+
+    return polygons
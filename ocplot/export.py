@@ -0,0 +1,234 @@
+"""Streaming export of colored stacks to chunked, compressed files (OME-Zarr or
+BigTIFF), coloring and compressing blocks of planes in parallel threads.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+
+from ocplot.stack_coloring import _normalize_to_255, color_stack
+
+
+class _LazyNormalized:
+    """Normalize slices of the anatomy only when they are read."""
+
+    def __init__(self, stack, hist_boundaries):
+        self.stack = stack
+        self.hist_boundaries = hist_boundaries
+
+    def __getitem__(self, item):
+        return _normalize_to_255(
+            self.stack[item].astype(float), hist_boundaries=self.hist_boundaries
+        )
+
+
+def _hist_boundaries(anatomy, hist_percentiles, n_planes=16):
+    """Percentiles of the anatomy histogram, estimated on evenly spaced planes, so
+    that the whole stack is never loaded in memory."""
+    n_planes = min(n_planes, anatomy.shape[0])
+    planes = np.unique(np.linspace(0, anatomy.shape[0] - 1, n_planes).astype(int))
+    return np.percentile(np.asarray(anatomy[planes]), hist_percentiles)
+
+
+def _iter_colored_blocks(
+    rois, variable, anatomy, block_size, executor, max_in_flight, **kwargs
+):
+    """Color blocks of planes in the executor, yielding (start plane, colored block)
+    in order, with at most max_in_flight blocks in memory."""
+
+    def _color_block(start):
+        block_anatomy = None
+        if anatomy is not None:
+            block_anatomy = anatomy[start : start + block_size]
+        return color_stack(
+            rois[start : start + block_size],
+            variable,
+            anatomy=block_anatomy,
+            **kwargs,
+        )
+
+    in_flight = deque()
+    for start in range(0, rois.shape[0], block_size):
+        if len(in_flight) == max_in_flight:
+            first_start, future = in_flight.popleft()
+            yield first_start, future.result()
+        in_flight.append((start, executor.submit(_color_block, start)))
+
+    while in_flight:
+        first_start, future = in_flight.popleft()
+        yield first_start, future.result()
+
+
+def _write_zarr(filename, blocks, shape, block_size, executor, max_in_flight):
+    """Write blocks to an OME-Zarr image, with (c, z, y, x) axes and one chunk
+    per block of planes. Blocks are compressed and written in the executor, with
+    at most max_in_flight pending writes."""
+    import zarr
+
+    # OME-Zarr 0.4 metadata is only valid in zarr v2 stores:
+    if int(zarr.__version__.split(".")[0]) >= 3:
+        root = zarr.open_group(str(filename), mode="w", zarr_format=2)
+    else:
+        root = zarr.open_group(str(filename), mode="w")
+    shape = (shape[-1],) + shape[:-1]
+    chunks = (shape[0], block_size) + shape[2:]
+    create = root.create_array if hasattr(root, "create_array") else root.create_dataset
+    array = create("0", shape=shape, chunks=chunks, dtype=np.uint8)
+    root.attrs["multiscales"] = [
+        dict(
+            version="0.4",
+            axes=[
+                dict(name="c", type="channel"),
+                dict(name="z", type="space"),
+                dict(name="y", type="space"),
+                dict(name="x", type="space"),
+            ],
+            datasets=[
+                dict(
+                    path="0",
+                    coordinateTransformations=[dict(type="scale", scale=[1.0] * 4)],
+                )
+            ],
+        )
+    ]
+
+    def _write_block(start, block):
+        array[:, start : start + len(block)] = np.moveaxis(block, -1, 0)
+
+    in_flight = set()
+    for start, block in blocks:
+        if len(in_flight) == max_in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            [future.result() for future in done]
+        in_flight.add(executor.submit(_write_block, start, block))
+    [future.result() for future in in_flight]
+
+
+def _write_tiff(filename, blocks, shape, n_threads, compression):
+    """Write blocks to a BigTIFF file, one page per plane, compressing strips of
+    each page in parallel."""
+    import tifffile
+
+    def _iter_planes():
+        for _, block in blocks:
+            yield from block
+
+    with tifffile.TiffWriter(filename, bigtiff=True) as tif:
+        tif.write(
+            _iter_planes(),
+            shape=shape,
+            dtype=np.uint8,
+            photometric="rgb",
+            compression=compression,
+            rowsperstrip=64,
+            maxworkers=n_threads,
+            metadata=dict(axes="ZYXS"),
+        )
+
+
+def export_colored_stack(
+    filename,
+    rois,
+    variable,
+    anatomy=None,
+    block_size=16,
+    n_threads=None,
+    max_in_flight=None,
+    compression="zlib",
+    hist_percentiles=None,
+    **kwargs,
+):
+    """Color a stack and write it to disk in a single streaming pass. Blocks of
+    planes are colored (and, for zarr, compressed and written) in a pool of threads,
+    with a bounded number of blocks in memory, so that stacks larger than memory
+    can be exported (eg, from memory-mapped rois and anatomy).
+
+    Parameters
+    ----------
+    filename : str or Path
+        Output file. Files ending with ".zarr" are written as an OME-Zarr image
+        (requires zarr), files ending with ".tif" or ".tiff" as a BigTIFF
+        (requires tifffile).
+    rois : 3D np.array
+        stack of ROIs (fimpy convention: -1 in empty voxels).
+    variable : 1D np.array or tuple of two 1D np.arrays
+        Variable for the coloring (see `color_stack`).
+    anatomy : 3D numpy array (optional)
+        If specified, ROIs will be overimposed on it (see `color_stack`).
+    block_size : int (optional)
+        Number of planes colored and written together (default=16).
+    n_threads : int (optional)
+        Number of threads (default=number of cores).
+    max_in_flight : int (optional)
+        Maximum number of colored blocks kept in memory, either being colored or
+        waiting to be written (default=2 * n_threads). For zarr, it is split between
+        coloring and writing, and should be at least 2.
+    compression : str (optional)
+        Compression of the BigTIFF pages; zarr uses its default compressor
+        (default="zlib").
+    hist_percentiles : tuple (optional)
+        Range used for the normalization of the anatomy histogram, if anatomy is not
+        already scaled. The percentiles are estimated on 16 evenly spaced planes
+        of the anatomy, and used for all blocks. Default (5, 99)
+    kwargs : dict
+        Additional arguments for `color_stack` (only RGBA output is supported).
+
+    Returns
+    -------
+    Path
+        Path of the written file.
+
+    """
+    if kwargs.get("output", "rgba") != "rgba":
+        raise ValueError("Only rgba output can be exported!")
+
+    filename = Path(filename)
+    if n_threads is None:
+        n_threads = os.cpu_count() or 1
+    if max_in_flight is None:
+        max_in_flight = 2 * n_threads
+
+    # Normalize the anatomy on the whole stack, so that all blocks are consistent:
+    if anatomy is not None:
+        if hist_percentiles is not None or anatomy.max() > 255 or anatomy.min() < 0:
+            if hist_percentiles is None:
+                hist_percentiles = (5, 99)
+            hist_boundaries = _hist_boundaries(anatomy, hist_percentiles)
+            anatomy = _LazyNormalized(anatomy, hist_boundaries)
+
+    shape = rois.shape + (4 if anatomy is None else 3,)
+
+    # For zarr, colored blocks are also kept in memory while waiting to be written:
+    max_writing = max_in_flight // 2 if filename.suffix == ".zarr" else 0
+    max_coloring = max(max_in_flight - max_writing, 1)
+
+    with ThreadPoolExecutor(n_threads) as color_executor:
+        blocks = _iter_colored_blocks(
+            rois,
+            variable,
+            anatomy,
+            block_size,
+            color_executor,
+            max_coloring,
+            **kwargs,
+        )
+
+        if filename.suffix == ".zarr":
+            with ThreadPoolExecutor(n_threads) as write_executor:
+                _write_zarr(
+                    filename,
+                    blocks,
+                    shape,
+                    block_size,
+                    write_executor,
+                    max(max_writing, 1),
+                )
+        elif filename.suffix in [".tif", ".tiff"]:
+            _write_tiff(filename, blocks, shape, n_threads, compression)
+        else:
+            raise ValueError("filename should end with either .zarr, .tif or .tiff!")
+
+    return filename
@@ -0,0 +1,65 @@
+"""Handles to the artists created by the ocplot helpers, to update them in place
+(eg, for animations or interactive parameter sweeps) instead of drawing them again.
+"""
+
+from abc import ABC, abstractmethod
+
+
+class ArtistHandle(ABC):
+    """Base class for handles returned by ocplot helpers. Subclasses implement
+    `_update`, which updates the artists in place.
+
+    Attributes that are not defined by the handle are looked up on its main
+    artist, so that the handle can be used in place of it (eg, `set_clim` on the
+    handle of a `color_plot`).
+
+    To use a handle with blitting in matplotlib FuncAnimation, set its artists as
+    animated and return the output of `update` from the animation function:
+
+    >>> handle = color_plot(x, y, ax=ax)
+    >>> handle.set_animated(True)
+    >>> def animate(i):
+    ...     return handle.update(x[:i], y[:i])
+    >>> anim = FuncAnimation(fig, animate, blit=True)
+
+    Parameters
+    ----------
+    artists : list of matplotlib artists
+        Artists created by the helper. The first is the main artist.
+
+    """
+
+    def __init__(self, artists):
+        self.artists = list(artists)
+
+    @property
+    def artist(self):
+        """Main artist of the handle."""
+        return self.artists[0]
+
+    def __getattr__(self, name):
+        # Guard against recursion before artists are set (eg, when unpickling):
+        if name == "artists":
+            raise AttributeError(name)
+        return getattr(self.artist, name)
+
+    def set_animated(self, animated=True):
+        """Set all artists of the handle as animated, to be used for blitting."""
+        for artist in self.artists:
+            artist.set_animated(animated)
+
+    def update(self, *args, **kwargs):
+        """Update the artists in place with new data.
+
+        Returns
+        -------
+        list of matplotlib artists
+            Updated artists, as required by FuncAnimation with blitting.
+
+        """
+        self._update(*args, **kwargs)
+        return self.artists
+
+    @abstractmethod
+    def _update(self, *args, **kwargs):
+        pass
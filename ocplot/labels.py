@@ -1,6 +1,3 @@
-import numpy as np
-
-
 def get_pval_stars(test_result):
     """Get number of stars or n.s. from p-values. Convention:
         - p < 0.001: ***
@@ -10,8 +7,9 @@ def get_pval_stars(test_result):
 
     Parameters
     ----------
-    test_result : float or scipy stats Result with pval attribute
-        Number or test to label with stars
+    test_result : float or object with pvalue attribute
+        Number or test to label with stars (eg, a scipy stats result, or a row
+        of the `permutation_tests` dataframe)
 
     Returns
     -------
@@ -19,7 +17,7 @@ def get_pval_stars(test_result):
         string describing the result.
 
     """
-    if type(test_result) not in [float, np.float64]:
+    if hasattr(test_result, "pvalue"):
         test_result = test_result.pvalue
 
     if test_result <= 0.0001:
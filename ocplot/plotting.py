@@ -1,8 +1,18 @@
+from functools import partial
+
 import numpy as np
-from matplotlib import cm, colors
+from matplotlib import colors
 from matplotlib import pyplot as plt
+from matplotlib.collections import LineCollection, PolyCollection
+
+from ocplot.axes_utils import set_rasterized
+from ocplot.color_utils import shift_lum
+from ocplot.handles import ArtistHandle
+from ocplot.profiling import profiled
+from ocplot.stats import bootstrap_ci
 
 
+@profiled
 def plot_arrow(seg, ax=None, col="b", alpha=1, s=10, lw=1):
     ax.plot(seg[:, 0], seg[:, 1], lw=lw, c=col, alpha=alpha)
     ax.scatter(seg[0, 0], seg[0, 1], zorder=100, s=s, color=col, alpha=alpha, lw=0)
@@ -22,6 +32,7 @@ def plot_arrow(seg, ax=None, col="b", alpha=1, s=10, lw=1):
     )
 
 
+@profiled
 def boxplot(data, cols=None, ax=None, widths=0.6, ec=(0.3,) * 3, vertical=True):
     """Plot a cleaned-up boxplot for data list.
 
@@ -72,11 +83,118 @@ def boxplot(data, cols=None, ax=None, widths=0.6, ec=(0.3,) * 3, vertical=True):
     return bplot
 
 
-def color_plot(x, y, ax=None, c=None, vlims=None, cmap="twilight", **kwargs):
-    """Line plot with a colormap. It works by plotting many
-    different segments with different colors, so way
-    less efficient than normal plotting.
-    Slow with traces > 10k points.
+def _density_image(x, y, c, shape, agg="mean"):
+    """Rasterize the segments of a trace on a pixel grid, aggregating the
+    color variable in each pixel.
+
+    Parameters
+    ----------
+    x, y, c : np.array
+        Trace coordinates and color variable. Each segment takes the value of c of
+        its end point.
+    shape : tuple
+        Number of pixels of the grid in y and x.
+    agg : str
+        Aggregation of c in each pixel: "mean", "last" or "count" (default="mean").
+
+    Returns
+    -------
+    np.array, tuple
+        (ny, nx) image (nan in empty pixels), and its extent for imshow.
+
+    """
+    ny, nx = shape
+    x, y, c = (np.asarray(v, dtype=float) for v in (x, y, c))
+    valid = ~(np.isnan(x) | np.isnan(y))
+    if agg != "count":
+        valid &= ~np.isnan(c)
+
+    extent = []
+    pixel_coords = []
+    for coords, n_pix in zip([x, y], [nx, ny]):
+        v0, v1 = np.nanmin(coords), np.nanmax(coords)
+        step = (v1 - v0) / (n_pix - 1) if v1 > v0 else 1.0
+        extent += [v0 - step / 2, v0 + step * (n_pix - 0.5)]
+        pixel_coords.append((coords - v0) / step)
+    px, py = pixel_coords
+
+    # Sample each valid segment at steps shorter than one pixel:
+    segments = np.argwhere(valid[:-1] & valid[1:])[:, 0]
+    dx, dy = px[segments + 1] - px[segments], py[segments + 1] - py[segments]
+    n_steps = np.ceil(np.maximum(np.abs(dx), np.abs(dy))).astype(int) + 1
+    seg_idx = np.repeat(np.arange(len(segments)), n_steps)
+    step_idx = np.arange(n_steps.sum()) - (np.cumsum(n_steps) - n_steps)[seg_idx]
+    t = step_idx / np.maximum(n_steps - 1, 1)[seg_idx]
+    pix_x = np.rint(px[segments][seg_idx] + t * dx[seg_idx]).astype(int)
+    pix_y = np.rint(py[segments][seg_idx] + t * dy[seg_idx]).astype(int)
+    pix = pix_y * nx + pix_x
+
+    # Count every segment once per pixel:
+    keep = np.ones(len(pix), dtype=bool)
+    keep[1:] = (pix[1:] != pix[:-1]) | (seg_idx[1:] != seg_idx[:-1])
+    pix, vals = pix[keep], c[segments + 1][seg_idx[keep]]
+
+    counts = np.bincount(pix, minlength=nx * ny).astype(float)
+    if agg == "count":
+        img = counts
+    elif agg == "mean":
+        sums = np.bincount(pix, weights=vals, minlength=nx * ny)
+        img = np.divide(sums, counts, out=np.full(nx * ny, np.nan), where=counts > 0)
+    elif agg == "last":
+        img = np.full(nx * ny, np.nan)
+        unique_pix, last_idx = np.unique(pix[::-1], return_index=True)
+        img[unique_pix] = vals[::-1][last_idx]
+    else:
+        raise ValueError("'agg' should be either mean, last or count!")
+    img[counts == 0] = np.nan
+
+    return img.reshape(ny, nx), tuple(extent)
+
+
+class ColorPlotHandle(ArtistHandle):
+    """Handle to a `color_plot` line or density image. Color limits are kept when
+    updating.
+    """
+
+    def __init__(self, artists, shape=None, agg="mean"):
+        super().__init__(artists)
+        self.shape = shape
+        self.agg = agg
+
+    def _update(self, x, y, c=None):
+        if c is None:
+            c = np.arange(len(x)) / len(x)
+
+        if self.shape is None:
+            points = np.stack([x, y], 1)
+            self.artist.set_segments(np.stack([points[:-1], points[1:]], 1))
+            self.artist.set_array(np.asarray(c)[1:])
+        else:
+            img, extent = _density_image(x, y, c, self.shape, agg=self.agg)
+            self.artist.set_data(img)
+            self.artist.set_extent(extent)
+
+
+@profiled
+def color_plot(
+    x,
+    y,
+    ax=None,
+    c=None,
+    vlims=None,
+    cmap="twilight",
+    rasterize=False,
+    mode="lines",
+    agg="mean",
+    resolution=None,
+    **kwargs,
+):
+    """Line plot with a colormap. By default, it works by plotting a collection
+    of segments with different colors, so it is less efficient than
+    normal plotting.
+    For very long traces, `mode="density"` rasterizes the trace on a pixel grid
+    and shows it as a single image, so that rendering time and file size do not
+    depend on the trace length.
 
     Parameters
     ----------
@@ -92,14 +210,26 @@ def color_plot(x, y, ax=None, c=None, vlims=None, cmap="twilight", **kwargs):
         Color limits for the color plot
     cmap : str
         Name of the matplotlib colormap to use
+    rasterize : bool
+        If True, the line is rasterized when saving to vector formats (default=False).
+    mode : str
+        Either "lines" (a collection of colored segments) or "density" (an image
+        of the trace aggregated in pixels) (default="lines").
+    agg : str
+        For the density mode, aggregation of `c` in each pixel: "mean", "last" or
+        "count", to color by number of segments crossing the pixel (default="mean").
+    resolution : tuple (optional)
+        For the density mode, number of pixels of the image in (x, y)
+        (default=size of the axes in display pixels).
     kwargs : dict
-        Additional arguments for the plt.plot function.
+        Additional arguments for the LineCollection (eg, lw, alpha, zorder), or
+        for plt.imshow in the density mode.
 
     Returns
     -------
-    plt.ScatterPlot
-        Or whatever the class is called. This is a dummy scatterplot to generate a color
-        bar.
+    ColorPlotHandle
+        Handle to the colored line or image (LineCollection or AxesImage), that can
+        be updated with new data and used to generate a color bar.
 
     """
     if ax is None:
@@ -107,31 +237,141 @@ def color_plot(x, y, ax=None, c=None, vlims=None, cmap="twilight", **kwargs):
 
     if c is None:
         c = np.arange(len(x)) / len(x)
-    else:
-        c = c
+
+    if mode == "density":
+        if resolution is None:
+            bbox = ax.get_window_extent()
+            resolution = max(int(bbox.width), 2), max(int(bbox.height), 2)
+        img, extent = _density_image(x, y, c, resolution[::-1], agg=agg)
+
+        if vlims is None:
+            # Default limits if no pixel has a valid color value:
+            vlims = (0, 1) if np.isnan(img).all() else (np.nanmin(img), np.nanmax(img))
+
+        kwargs.setdefault("aspect", "auto")
+        kwargs.setdefault("interpolation", "nearest")
+        density = ax.imshow(
+            img,
+            extent=extent,
+            origin="lower",
+            cmap=cmap,
+            norm=colors.Normalize(vmin=vlims[0], vmax=vlims[1]),
+            **kwargs,
+        )
+        set_rasterized([density], rasterize)
+
+        return ColorPlotHandle([density], shape=resolution[::-1], agg=agg)
+
+    elif mode != "lines":
+        raise ValueError("'mode' should be either lines or density!")
 
     if vlims is None:
         vlims = np.nanmin(c), np.nanmax(c)
 
-    cmap_fun = cm.get_cmap(cmap)
     norm = colors.Normalize(vmin=vlims[0], vmax=vlims[1])
 
-    # Required for stupid matplotlib to create a usable palette
-    dummy_scatter = ax.scatter(
-        [None], [None], vmin=vlims[0], vmax=vlims[1], c=[None], cmap=cmap
+    points = np.stack([x, y], 1)
+    kwargs.setdefault("capstyle", "round")
+    lines = LineCollection(
+        np.stack([points[:-1], points[1:]], 1),
+        cmap=plt.get_cmap(cmap),
+        norm=norm,
+        **kwargs,
     )
-    for i in range(1, len(x)):
-        ax.plot(
-            x[i - 1 : i + 1],
-            y[i - 1 : i + 1],
-            c=cmap_fun(norm(c[i])),
-            solid_capstyle="round",
-            **kwargs,
-        )
+    lines.set_array(np.asarray(c)[1:])
+    ax.add_collection(lines)
+    ax.autoscale_view()
+
+    set_rasterized([lines], rasterize)
+
+    return ColorPlotHandle([lines])
+
+
+@profiled
+def show_colored(image, ax=None, rasterize=False, **kwargs):
+    """Show an RGB(A) image, eg a projection of a `color_stack` output.
+
+    Parameters
+    ----------
+    image : np.array
+        (n, m, 3) or (n, m, 4) image.
+    ax : plt.Axes
+        Axes on which to plot (default=current).
+    rasterize : bool
+        If True, the image is resampled at the savefig dpi when saving to vector
+        formats, instead of being embedded at full resolution (default=False).
+    kwargs : dict
+        Additional arguments for the plt.imshow function.
+
+    Returns
+    -------
+    AxesImage
+
+    """
+    if ax is None:
+        ax = plt.gca()
 
-    return dummy_scatter
+    img = ax.imshow(image, **kwargs)
+    set_rasterized([img], rasterize)
 
+    return img
+
+
+def _get_moments(df, moment="quantiles", seed=0):
+    """Upper bound, center and lower bound of the bars for each column of df.
+
+    :param df: dataframe, one column per bar
+    :param moment: either "quantiles" (median and interquartile range) or
+        "bootstrap" (mean and bootstrap 95% confidence interval)
+    :param seed: seed of the bootstrap resampling, for reproducible bars
+    :return: dataframe with the bounds and centers as rows
+    """
+    if moment == "quantiles":
+        return df.quantile([0.75, 0.5, 0.25])
+    elif moment == "bootstrap":
+        return bootstrap_ci(df, seed=seed)[["ci_high", "statistic", "ci_low"]].T
+    else:
+        raise ValueError("'moment' should be either quantiles or bootstrap!")
+
+
+class MomentBarsHandle(ArtistHandle):
+    """Handle to the bars of `tick_with_bars` or `bar_with_bars` (center and range
+    of each column, from quantiles or bootstrap), updated with a new dataframe
+    with the same columns.
+    """
 
+    def __init__(self, xs, s, medians, ranges, fills=None, moment="quantiles", seed=0):
+        super().__init__(list(medians) + list(ranges) + list(fills or []))
+        self.xs = xs
+        self.s = s
+        self.moment = moment
+        self.seed = seed
+        self.medians = medians
+        self.ranges = ranges
+        self.fills = fills
+
+    def _update(self, df):
+        res_df = _get_moments(df, self.moment, seed=self.seed)
+        for i, x in enumerate(self.xs):
+            q_high, median, q_low = res_df.iloc[:, i]
+            self.ranges[i].set_ydata([q_high, q_low])
+            if self.fills is None:
+                self.medians[i].set_ydata([median] * 2)
+            else:
+                self.medians[i].set_ydata([0, median, median, 0])
+                self.fills[i].set_verts(
+                    [
+                        [
+                            (x - self.s, 0),
+                            (x + self.s, 0),
+                            (x + self.s, median),
+                            (x - self.s, median),
+                        ]
+                    ]
+                )
+
+
+@profiled
 def tick_with_bars(
     df,
     ax=None,
@@ -141,6 +381,7 @@ def tick_with_bars(
     xdisperse=0,
     s=0.04,
     lw=1,
+    seed=0,
 ):
     if ax is None:
         ax = plt.gca()
@@ -148,11 +389,14 @@ def tick_with_bars(
     if type(xdisperse) is bool:  # if we just passed true, infer from s
         xdisperse = s * 2
 
-    res_df = df.quantile([0.75, 0.5, 0.25])
+    res_df = _get_moments(df, moment, seed=seed)
 
+    rng = np.random.default_rng(seed)
+    offsets, medians, ranges = [], [], []
     for i in range(len(res_df.columns)):
-        off = i + (np.random.rand() - 0.5) * xdisperse
-        ax.plot(
+        off = i + (rng.random() - 0.5) * xdisperse
+        offsets.append(off)
+        medians += ax.plot(
             [off - s, off + s],
             [
                 res_df.iloc[1, i],
@@ -164,7 +408,7 @@ def tick_with_bars(
             zorder=100,
             label="_nolegend_",
         )
-        ax.plot(
+        ranges += ax.plot(
             [off, off],
             res_df.iloc[[0, 2], i],
             lw=lw,
@@ -174,13 +418,24 @@ def tick_with_bars(
             label=label,
         )
 
+    return MomentBarsHandle(offsets, s, medians, ranges, moment=moment, seed=seed)
 
+
+@profiled
 def bar_with_bars(
-    df, ax=None, cols=None, moment="quantiles", s=0.1, empty=False, lw=1, ec=".1"
+    df,
+    ax=None,
+    cols=None,
+    moment="quantiles",
+    s=0.1,
+    empty=False,
+    lw=1,
+    ec=".1",
+    seed=0,
 ):
     if ax is None:
         ax = plt.gca()
-    res_df = df.quantile([0.75, 0.5, 0.25])
+    res_df = _get_moments(df, moment, seed=seed)
 
     if empty:
         ec_list = cols
@@ -189,8 +444,9 @@ def bar_with_bars(
         ec_list = [ec for _ in cols]
         cols_list = cols
 
+    fills, medians, ranges = [], [], []
     for i in range(len(res_df.columns)):
-        ax.fill_between(
+        fill = ax.fill_between(
             [i - s, i + s],
             [
                 0,
@@ -205,7 +461,8 @@ def bar_with_bars(
             fc=cols_list[i],
             zorder=100,
         )
-        ax.plot(
+        fills.append(fill)
+        medians += ax.plot(
             [i - s, i - s, i + s, i + s],
             [
                 0,
@@ -221,7 +478,7 @@ def bar_with_bars(
             c=ec_list[i],
             zorder=100,
         )
-        ax.plot(
+        ranges += ax.plot(
             [i, i],
             res_df.iloc[[0, 2], i],
             lw=lw,
@@ -230,49 +487,83 @@ def bar_with_bars(
             zorder=100,
         )
 
+    return MomentBarsHandle(
+        range(len(res_df.columns)),
+        s,
+        medians,
+        ranges,
+        fills,
+        moment=moment,
+        seed=seed,
+    )
+
 
 # TODO polish this
-def add_looming_triangle(ax, x_tip_pos, x_end_pos, x_end_stripe=None, y_pos=None, y_height=None,
-                         y_pos_fract=None,
-                         y_width_fract=None,
-                         text=None,
-                         text_kwargs={},
-                         **kwargs):
+@profiled
+def add_looming_triangle(
+    ax,
+    x_tip_pos,
+    x_end_pos,
+    x_end_stripe=None,
+    y_pos=None,
+    y_height=None,
+    y_pos_fract=None,
+    y_width_fract=None,
+    text=None,
+    text_kwargs={},
+    **kwargs,
+):
     y0, y1 = ax.get_ylim()
     x0, x1 = ax.get_xlim()
 
     if x_end_stripe is None:
         x_end_stripe = x1
     plot_width = y1 - y0
-    print(plot_width)
     if y_pos_fract is not None:
         y_pos = y0 + plot_width * y_pos_fract
     if y_width_fract is not None:
         y_height = plot_width * y_width_fract
-    print(y_pos, y_height)
-    plot = ax.fill_between([x_tip_pos, x_end_pos, x_end_stripe], 
-                    [y_pos, y_pos-y_height/2, y_pos-y_height/2], 
-                    [y_pos, y_pos+y_height/2, y_pos+y_height/2], 
-                    **kwargs)
+    plot = ax.fill_between(
+        [x_tip_pos, x_end_pos, x_end_stripe],
+        [y_pos, y_pos - y_height / 2, y_pos - y_height / 2],
+        [y_pos, y_pos + y_height / 2, y_pos + y_height / 2],
+        **kwargs,
+    )
     ax.set_xlim((x0, x1))
     ax.set_ylim((y0, y1))
 
+    text_kwargs = dict(text_kwargs)
     if "fontsize" not in text_kwargs.keys():
         text_kwargs["fontsize"] = 8
     if "color" not in text_kwargs.keys():
-        text_kwargs["color"] = ocp.shift_lum(plot.get_fc(), 0.5)
+        text_kwargs["color"] = shift_lum(plot.get_fc(), 0.5)
 
+    texts = []
     if text is not None:
-        ax.text(x_end_stripe, y_pos, text, ha="right", va="center", **text_kwargs)
-
-    return plot
-    
-def add_stim_bar(ax, xstart, xend=None, y_pos=None, y_height=None, 
-                    y_pos_fract=0.9, y_width_fract=0.1, 
-                    text=None,
-                    text_kwargs={},
-                    alpha=0.5,
-                    **kwargs):
+        texts.append(
+            ax.text(x_end_stripe, y_pos, text, ha="right", va="center", **text_kwargs)
+        )
+
+    make_verts = partial(
+        _looming_triangles_verts, x_max=x1, y_pos=y_pos, y_height=y_height
+    )
+    return StimHandle(plot, texts, make_verts)
+
+
+@profiled
+def add_stim_bar(
+    ax,
+    xstart,
+    xend=None,
+    y_pos=None,
+    y_height=None,
+    y_pos_fract=0.9,
+    y_width_fract=0.1,
+    text=None,
+    text_kwargs={},
+    alpha=0.5,
+    **kwargs,
+):
     """Add a bar to the axis to indicate stimulus time
 
     Parameters
@@ -291,34 +582,274 @@ def add_stim_bar(ax, xstart, xend=None, y_pos=None, y_height=None,
         vertical position of the bar, by default 0.9 of axis height
     y_width_fract : float, optional
         vertical size of the bar, by default 0.1 of axis height
+
+    Returns
+    -------
+    StimHandle
+        Handle to the bar and its label.
     """
     y0, y1 = ax.get_ylim()
     x0, x1 = ax.get_xlim()
     if xend is None:
         xend = x1
-    
+
     plot_width = y1 - y0
     if y_pos_fract is not None:
         y_pos = y0 + plot_width * y_pos_fract
     if y_width_fract is not None:
         y_height = plot_width * y_width_fract
-    print(plot_width, y_pos, y_height)
 
     kwargs["alpha"] = alpha
-    
-    plot = ax.fill_between([xstart, xend], 
-                    [y_pos-y_height/2, y_pos-y_height/2], 
-                    [y_pos+y_height/2, y_pos+y_height/2], 
-                    **kwargs)
+
+    plot = ax.fill_between(
+        [xstart, xend],
+        [y_pos - y_height / 2, y_pos - y_height / 2],
+        [y_pos + y_height / 2, y_pos + y_height / 2],
+        **kwargs,
+    )
     ax.set_xlim((x0, x1))
     ax.set_ylim((y0, y1))
 
+    text_kwargs = dict(text_kwargs)
     if "fontsize" not in text_kwargs.keys():
         text_kwargs["fontsize"] = 8
     if "color" not in text_kwargs.keys():
-        text_kwargs["color"] = ocp.shift_lum(plot.get_fc(), 0.5)
+        text_kwargs["color"] = shift_lum(plot.get_fc(), 0.5)
 
+    texts = []
     if text is not None:
-        ax.text(xend, y_pos, text, ha="right", va="center", **text_kwargs)
+        texts.append(ax.text(xend, y_pos, text, ha="right", va="center", **text_kwargs))
+
+    make_verts = partial(_stim_bars_verts, x_max=x1, y_pos=y_pos, y_height=y_height)
+    return StimHandle(plot, texts, make_verts)
+
+
+def _stim_y_extent(ax, y_pos, y_height, y_pos_fract, y_width_fract):
+    """Vertical position and height of stimulus markers, optionally from fractions
+    of the current y limits.
+    """
+    y0, y1 = ax.get_ylim()
+    if y_pos_fract is not None:
+        y_pos = y0 + (y1 - y0) * y_pos_fract
+    if y_width_fract is not None:
+        y_height = (y1 - y0) * y_width_fract
+    return y_pos, y_height
+
+
+def _stim_bars_verts(xstarts, xends=None, x_max=None, y_pos=None, y_height=None):
+    """Vertices of stimulus bars, and x positions of their labels."""
+    xstarts = np.atleast_1d(np.asarray(xstarts, dtype=float))
+    if xends is None:
+        xends = x_max
+    xends = np.broadcast_to(np.asarray(xends, dtype=float), xstarts.shape)
+
+    ys = np.broadcast_to(
+        [y_pos - y_height / 2] * 2 + [y_pos + y_height / 2] * 2, (len(xstarts), 4)
+    )
+    return np.stack([np.stack([xstarts, xends, xends, xstarts], 1), ys], 2), xends
+
+
+def _looming_triangles_verts(
+    x_tip_pos, x_end_pos, x_end_stripe=None, x_max=None, y_pos=None, y_height=None
+):
+    """Vertices of looming triangles, and x positions of their labels."""
+    x_tip_pos = np.atleast_1d(np.asarray(x_tip_pos, dtype=float))
+    x_end_pos = np.broadcast_to(np.asarray(x_end_pos, dtype=float), x_tip_pos.shape)
+    if x_end_stripe is None:
+        x_end_stripe = x_max
+    x_end_stripe = np.broadcast_to(
+        np.asarray(x_end_stripe, dtype=float), x_tip_pos.shape
+    )
+
+    xs = np.stack([x_tip_pos, x_end_pos, x_end_stripe, x_end_stripe, x_end_pos], 1)
+    ys = np.broadcast_to(
+        [y_pos] + [y_pos - y_height / 2] * 2 + [y_pos + y_height / 2] * 2,
+        xs.shape,
+    )
+    return np.stack([xs, ys], 2), x_end_stripe
+
 
-    return plot
\ No newline at end of file
+class StimHandle(ArtistHandle):
+    """Handle to stimulus markers, updated with new stimulus positions (same
+    arguments of the positions in the function that created them). Labels are
+    moved with the markers. The number of stimuli cannot change, as colors and
+    labels are set per stimulus.
+    """
+
+    def __init__(self, collection, texts, make_verts, n_events=1, text_events=None):
+        super().__init__([collection] + list(texts))
+        self.texts = texts
+        self.make_verts = make_verts
+        self.n_events = n_events
+        self.text_events = range(len(texts)) if text_events is None else text_events
+
+    def _update(self, *args, **kwargs):
+        verts, label_xs = self.make_verts(*args, **kwargs)
+        if len(verts) != self.n_events:
+            raise ValueError(
+                f"Expected {self.n_events} stimuli, as in the original call, "
+                f"got {len(verts)}!"
+            )
+        self.artist.set_verts(verts)
+        for text, event in zip(self.texts, self.text_events):
+            text.set_x(label_xs[event])
+
+
+def _add_stim_collection(
+    ax, make_verts, verts, cols, labels, label_xs, y_pos, text_kwargs, kwargs
+):
+    """Add polygons for many stimuli as a single collection, without changing the
+    axes limits, and label them. Returns their StimHandle.
+    """
+    if cols is not None:
+        kwargs["facecolors"] = cols
+        kwargs.setdefault("edgecolors", "none")
+
+    collection = PolyCollection(verts, **kwargs)
+    ax.add_collection(collection, autolim=False)
+
+    texts, text_events = [], []
+    if labels is not None:
+        text_kwargs = dict() if text_kwargs is None else dict(text_kwargs)
+        text_kwargs.setdefault("fontsize", 8)
+        facecolors = np.broadcast_to(collection.get_facecolor(), (len(verts), 4))
+        for event, (label, x, fc) in enumerate(zip(labels, label_xs, facecolors)):
+            if label is None:
+                continue
+            label_kwargs = dict(text_kwargs)
+            label_kwargs.setdefault("color", shift_lum(fc, 0.5))
+            texts.append(
+                ax.text(x, y_pos, label, ha="right", va="center", **label_kwargs)
+            )
+            text_events.append(event)
+
+    return StimHandle(collection, texts, make_verts, len(verts), text_events)
+
+
+@profiled
+def add_stim_bars(
+    ax,
+    xstarts,
+    xends=None,
+    cols=None,
+    labels=None,
+    y_pos=None,
+    y_height=None,
+    y_pos_fract=0.9,
+    y_width_fract=0.1,
+    text_kwargs=None,
+    alpha=0.5,
+    **kwargs,
+):
+    """Add bars to the axis to indicate many stimulus epochs, drawn as a single
+    collection. Axes limits are left untouched.
+
+    Parameters
+    ----------
+    ax : plt.Axes
+        Axis to add bars to
+    xstarts : array
+        Starts of the bars
+    xends : array, optional
+        Ends of the bars, if not the end of the plot
+    cols : list, optional
+        Color for each bar, by default the color passed in kwargs
+    labels : list of str, optional
+        Label for each bar (None for no label), by default no labels
+    y_pos : float, optional
+        y position of the bars, by default None
+    y_height : float, optional
+        height of the bars, by default None
+    y_pos_fract : float, optional
+        vertical position of the bars, by default 0.9 of axis height
+    y_width_fract : float, optional
+        vertical size of the bars, by default 0.1 of axis height
+    text_kwargs : dict, optional
+        Arguments for the labels text
+    alpha : float, optional
+        Alpha of the bars, by default 0.5
+    kwargs : dict
+        Additional arguments for the PolyCollection
+
+    Returns
+    -------
+    StimHandle
+        Handle to the PolyCollection and the labels.
+
+    """
+    y_pos, y_height = _stim_y_extent(ax, y_pos, y_height, y_pos_fract, y_width_fract)
+    make_verts = partial(
+        _stim_bars_verts, x_max=ax.get_xlim()[1], y_pos=y_pos, y_height=y_height
+    )
+    verts, label_xs = make_verts(xstarts, xends)
+
+    kwargs["alpha"] = alpha
+    return _add_stim_collection(
+        ax, make_verts, verts, cols, labels, label_xs, y_pos, text_kwargs, kwargs
+    )
+
+
+@profiled
+def add_looming_triangles(
+    ax,
+    x_tip_pos,
+    x_end_pos,
+    x_end_stripe=None,
+    cols=None,
+    labels=None,
+    y_pos=None,
+    y_height=None,
+    y_pos_fract=None,
+    y_width_fract=None,
+    text_kwargs=None,
+    **kwargs,
+):
+    """Add looming stimulus markers (a triangle growing from the tip to the
+    end position, followed by a stripe) for many stimuli, drawn as a single
+    collection. Axes limits are left untouched.
+
+    Parameters
+    ----------
+    ax : plt.Axes
+        Axis to add markers to
+    x_tip_pos : array
+        Positions of the triangle tips (looming starts)
+    x_end_pos : array
+        Positions of the triangle ends (looming ends)
+    x_end_stripe : array, optional
+        Ends of the stripes after the triangles, by default the end of the plot
+    cols : list, optional
+        Color for each marker, by default the color passed in kwargs
+    labels : list of str, optional
+        Label for each marker (None for no label), by default no labels
+    y_pos : float, optional
+        y position of the markers, by default None
+    y_height : float, optional
+        height of the markers, by default None
+    y_pos_fract : float, optional
+        vertical position of the markers as a fraction of axis height
+    y_width_fract : float, optional
+        vertical size of the markers as a fraction of axis height
+    text_kwargs : dict, optional
+        Arguments for the labels text
+    kwargs : dict
+        Additional arguments for the PolyCollection
+
+    Returns
+    -------
+    StimHandle
+        Handle to the PolyCollection and the labels.
+
+    """
+    y_pos, y_height = _stim_y_extent(ax, y_pos, y_height, y_pos_fract, y_width_fract)
+    make_verts = partial(
+        _looming_triangles_verts,
+        x_max=ax.get_xlim()[1],
+        y_pos=y_pos,
+        y_height=y_height,
+    )
+    verts, label_xs = make_verts(x_tip_pos, x_end_pos, x_end_stripe)
+
+    return _add_stim_collection(
+        ax, make_verts, verts, cols, labels, label_xs, y_pos, text_kwargs, kwargs
+    )
@@ -0,0 +1,202 @@
+"""Opt-in instrumentation of the ocplot plotting helpers, to find out which helper
+calls are responsible for slow figures.
+"""
+
+import functools
+import inspect
+import json
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from matplotlib import pyplot as plt
+from matplotlib.collections import Collection
+from matplotlib.image import AxesImage
+from matplotlib.lines import Line2D
+from matplotlib.patches import Patch
+
+# Rough weights (in vertices) used to estimate the drawing cost of new artists:
+ARTIST_COST = 100
+PIXEL_COST = 0.01
+
+_state = threading.local()
+
+
+class HelperProfiler:
+    """Records, for each ocplot helper call, the wall time, the number of
+    artists and vertices added, and an estimate of the drawing cost.
+
+    Use it through `profile_helpers`. Profiling is active only in the thread
+    where the context was entered.
+    """
+
+    def __init__(self):
+        self.records = []
+
+    def __enter__(self):
+        _active_profilers().append(self)
+        return self
+
+    def __exit__(self, *exc):
+        _active_profilers().remove(self)
+
+    def to_dataframe(self):
+        """All recorded calls, one row per call."""
+        return pd.DataFrame(
+            self.records,
+            columns=[
+                "helper",
+                "wall_time",
+                "n_artists",
+                "n_vertices",
+                "n_pixels",
+                "draw_cost",
+            ],
+        )
+
+    def summary(self):
+        """Recorded calls aggregated by helper, sorted by estimated drawing cost.
+
+        Returns
+        -------
+        pd.DataFrame
+            Table with number of calls and total time, artists, vertices, pixels
+            and drawing cost per helper.
+
+        """
+        calls_df = self.to_dataframe()
+        summary_df = calls_df.groupby("helper").sum()
+        summary_df.insert(0, "n_calls", calls_df.groupby("helper").size())
+        return summary_df.sort_values("draw_cost", ascending=False)
+
+    def to_json(self, filename=None):
+        """Dump all recorded calls to JSON.
+
+        Parameters
+        ----------
+        filename : str or Path (optional)
+            If passed, JSON is written to this file (default=None).
+
+        Returns
+        -------
+        str
+            JSON string with the list of recorded calls.
+
+        """
+        json_str = json.dumps(self.records, indent=2)
+        if filename is not None:
+            with open(filename, "w") as f:
+                f.write(json_str)
+        return json_str
+
+
+def profile_helpers():
+    """Context manager to profile the ocplot helpers called inside it.
+
+    Examples
+    --------
+    >>> with profile_helpers() as prof:
+    ...     color_plot(x, y, ax=ax)
+    >>> prof.summary()
+
+    Returns
+    -------
+    HelperProfiler
+
+    """
+    return HelperProfiler()
+
+
+def _active_profilers():
+    if not hasattr(_state, "profilers"):
+        _state.profilers = []
+        _state.depth = 0
+    return _state.profilers
+
+
+def _collect_artists(fig):
+    """Axes of a figure (including insets) and the artists drawn in them and in
+    the figure. Ticks and axis children are not included, as matplotlib may create
+    them when autoscaling, and not as part of the helpers."""
+    if fig is None:
+        return set()
+    artists = set()
+    to_visit = [fig] + list(fig.axes)
+    while to_visit:
+        container = to_visit.pop()
+        if container is not fig:
+            artists.add(container)
+            to_visit.extend(a for a in container.child_axes if a not in artists)
+        for artists_list in ["lines", "collections", "patches", "images", "texts"]:
+            artists.update(getattr(container, artists_list, []))
+        artists.update(container.artists)
+    return artists
+
+
+def _artist_size(artist):
+    """Number of vertices and pixels drawn by an artist."""
+    if isinstance(artist, Line2D):
+        return len(artist.get_xydata()), 0
+    if isinstance(artist, Collection):
+        n_vertices = sum(len(path.vertices) for path in artist.get_paths())
+        n_offsets = len(artist.get_offsets())
+        return n_vertices * max(n_offsets, 1), 0
+    if isinstance(artist, Patch):
+        return len(artist.get_path().vertices), 0
+    if isinstance(artist, AxesImage):
+        data = artist.get_array()
+        return 0, 0 if data is None else int(np.prod(data.shape[:2]))
+    return 0, 0
+
+
+def _get_figure(ax):
+    if ax is not None:
+        return ax.figure
+    # Helpers fall back to the pyplot current axes:
+    return plt.gcf() if plt.get_fignums() else None
+
+
+def profiled(fun):
+    """Decorator to record calls of a helper in the active profilers. The helper
+    must take the axes on which it draws as the `ax` argument.
+    """
+    signature = inspect.signature(fun)
+
+    @functools.wraps(fun)
+    def wrapper(*args, **kwargs):
+        profilers = _active_profilers()
+        # Only calls of the outermost helper are recorded:
+        if len(profilers) == 0 or _state.depth > 0:
+            return fun(*args, **kwargs)
+
+        ax = signature.bind_partial(*args, **kwargs).arguments.get("ax")
+        artists_before = _collect_artists(_get_figure(ax))
+
+        _state.depth += 1
+        start = time.perf_counter()
+        try:
+            result = fun(*args, **kwargs)
+        finally:
+            _state.depth -= 1
+        wall_time = time.perf_counter() - start
+
+        new_artists = _collect_artists(_get_figure(ax)) - artists_before
+        sizes = np.array([_artist_size(a) for a in new_artists]).reshape(-1, 2)
+        n_vertices, n_pixels = (int(n) for n in sizes.sum(0))
+        record = dict(
+            helper=fun.__name__,
+            wall_time=wall_time,
+            n_artists=len(new_artists),
+            n_vertices=n_vertices,
+            n_pixels=n_pixels,
+            draw_cost=len(new_artists) * ARTIST_COST
+            + n_vertices
+            + n_pixels * PIXEL_COST,
+        )
+        for profiler in profilers:
+            profiler.records.append(record)
+
+        return result
+
+    return wrapper
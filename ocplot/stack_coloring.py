@@ -2,15 +2,57 @@
 and motions.color.
 """
 
+import time
+from collections import namedtuple
+
 import numpy as np
+from matplotlib.colors import BoundaryNorm, ListedColormap, to_rgba
 from ocplot.color_utils import (
     _get_categorical_colors,
+    get_bivariate_colors,
     get_continuous_colors,
 )
-from numba import njit
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# dtypes for which the compiled coloring kernel is available. Other dtypes are
+# colored with the numpy implementation:
+LABEL_DTYPES = (np.int16, np.int32, np.int64)
+COLOR_DTYPES = (np.uint8, np.float64)
+
+
+def _fill_roi_stack_loop(rois, roi_colors, background):
+    coloured = np.zeros(rois.shape + (roi_colors.shape[1],), dtype=roi_colors.dtype)
+    for i in range(rois.shape[0]):
+        for j in range(rois.shape[1]):
+            for k in range(rois.shape[2]):
+                if rois[i, j, k] > -1:
+                    coloured[i, j, k] = roi_colors[rois[i, j, k], :]
+                else:
+                    coloured[i, j, k] = background
+    return coloured
+
+
+def _fill_roi_stack_numpy(rois, roi_colors, background):
+    coloured = np.empty(rois.shape + (roi_colors.shape[1],), dtype=roi_colors.dtype)
+    selection = rois > -1
+    coloured[selection] = roi_colors[rois[selection], :]
+    coloured[~selection] = background
+    return coloured
+
+
+if njit is not None:
+    # Compiled on first use for each dtype (and writeability) and cached on disk,
+    # so that new processes do not pay the compilation time. The GIL is released,
+    # so that blocks of a stack can be colored in parallel threads:
+    _fill_roi_stack_jit = njit(cache=True, nogil=True)(_fill_roi_stack_loop)
+else:
+    _fill_roi_stack_jit = None
 
 
-@njit
 def _fill_roi_stack(
     rois,
     roi_colors,
@@ -21,15 +63,100 @@ def _fill_roi_stack(
         * 4
     ),
 ):
-    coloured = np.zeros(rois.shape + (roi_colors.shape[1],), dtype=roi_colors.dtype)
-    for i in range(rois.shape[0]):
-        for j in range(rois.shape[1]):
-            for k in range(rois.shape[2]):
-                if rois[i, j, k] > -1:
-                    coloured[i, j, k] = roi_colors[rois[i, j, k], :]
-                else:
-                    coloured[i, j, k] = background[: roi_colors.shape[1]]
-    return coloured
+    """Fill a stack with the color of each ROI.
+
+    :param rois: the ROI stack (-1 in empty voxels)
+    :param roi_colors: (n_rois, n_channels) colors for each ROI
+    :param background: color of the empty voxels
+    :return: (rois.shape + (n_channels,)) colored stack, with the roi_colors dtype
+    """
+    background = np.asarray(background, dtype=roi_colors.dtype).ravel()[
+        : roi_colors.shape[1]
+    ]
+
+    if (
+        _fill_roi_stack_jit is not None
+        and rois.dtype in LABEL_DTYPES
+        and roi_colors.dtype in COLOR_DTYPES
+    ):
+        return _fill_roi_stack_jit(rois, roi_colors, background)
+
+    return _fill_roi_stack_numpy(rois, roi_colors, background)
+
+
+def _exclude_rois(rois, excluded):
+    """Set to -1 the voxels of the excluded ROIs.
+
+    :param rois: the ROI stack
+    :param excluded: boolean array, True for ROIs to exclude
+    :return: the ROI stack without the excluded ROIs
+    """
+    dtype = np.promote_types(rois.dtype, np.int8)  # signed, to hold -1
+    lut = np.arange(-1, max(int(rois.max()) + 1, len(excluded)), dtype=dtype)
+    lut[1:][: len(excluded)][excluded] = -1
+    return lut[rois + 1]
+
+
+def _label_boundaries(labels, width=1):
+    """Find the voxels on the boundary of each label, comparing neighbours
+    within each plane (last two axes).
+
+    :param labels: stack of labels (-1 in empty voxels)
+    :param width: width of the boundaries, in voxels
+    :return: boolean stack, True on the boundaries
+    """
+    labels = labels.copy()
+    boundaries = np.zeros(labels.shape, dtype=bool)
+    pad_width = [(0, 0)] * (labels.ndim - 2) + [(1, 1), (1, 1)]
+    neighbours = [
+        (slice(None, -2), slice(1, -1)),
+        (slice(2, None), slice(1, -1)),
+        (slice(1, -1), slice(None, -2)),
+        (slice(1, -1), slice(2, None)),
+    ]
+
+    # Peel boundaries off the labels one voxel at the time:
+    for _ in range(width):
+        padded = np.pad(labels, pad_width, constant_values=-1)
+        edges = np.zeros(labels.shape, dtype=bool)
+        for neighbour in neighbours:
+            edges |= padded[(Ellipsis,) + neighbour] != labels
+        edges &= labels > -1
+
+        boundaries |= edges
+        labels[edges] = -1
+
+    return boundaries
+
+
+def _outline_color(outline_color, n_channels):
+    return (np.array(to_rgba(outline_color)) * 255).astype(np.uint8)[:n_channels]
+
+
+def warmup_kernels(readonly=False):
+    """Run the coloring kernels once for all the supported dtypes, so that the
+    first actual call does not pay compilation or cache loading time.
+
+    Parameters
+    ----------
+    readonly : bool (optional)
+        If True, the kernels for read-only ROI stacks (eg, memory-mapped) are
+        also compiled. Default False.
+
+    Returns
+    -------
+    float
+        Time taken by the warmup, in seconds.
+
+    """
+    start = time.perf_counter()
+    for label_dtype in LABEL_DTYPES:
+        for color_dtype in COLOR_DTYPES:
+            for writeable in [True, False] if readonly else [True]:
+                rois = np.zeros((1, 1, 1), dtype=label_dtype)
+                rois.setflags(write=writeable)
+                _fill_roi_stack(rois, np.zeros((1, 4), dtype=color_dtype))
+    return time.perf_counter() - start
 
 
 def _color_anatomy_rgb(rois, roi_colors, anatomy, alpha=0.9, invert_anatomy=True):
@@ -68,8 +195,44 @@ def _color_anatomy_rgb(rois, roi_colors, anatomy, alpha=0.9, invert_anatomy=True
     return overimposed.astype(np.uint8)
 
 
-def _normalize_to_255(stack, hist_percentiles=(5, 99)):
-    hist_boundaries = [np.percentile(stack, p) for p in hist_percentiles]
+IndexedStack = namedtuple("IndexedStack", ["indexes", "palette", "cmap", "norm"])
+IndexedStack.__doc__ = """Palette-indexed colored stack.
+
+indexes : stack of palette indexes (0 for the background, i + 1 for ROI i)
+palette : (n_rois + 1, 4) uint8 palette
+cmap, norm : colormap and norm to show the indexes with plt.imshow
+"""
+
+
+def _index_roi_stack(rois, roi_colors, background):
+    """Make a compact stack of palette indexes from ROI colors. Index 0 is the
+    background and index i + 1 is ROI i, so that the stack can be recolored with
+    a new per-ROI variable by changing the palette only.
+
+    :param rois: the ROI stack (-1 in empty voxels)
+    :param roi_colors: (n_rois, 4) colors for each ROI
+    :param background: color of the empty voxels
+    :return: IndexedStack
+    """
+    palette = np.concatenate(
+        [np.asarray(background)[np.newaxis, :4], roi_colors[:, :4]]
+    ).astype(np.uint8)
+
+    for dtype in [np.uint8, np.uint16, np.uint32]:
+        if len(palette) <= np.iinfo(dtype).max + 1:
+            break
+
+    return IndexedStack(
+        indexes=(rois + 1).astype(dtype),
+        palette=palette,
+        cmap=ListedColormap(palette / 255),
+        norm=BoundaryNorm(np.arange(len(palette) + 1) - 0.5, len(palette)),
+    )
+
+
+def _normalize_to_255(stack, hist_percentiles=(5, 99), hist_boundaries=None):
+    if hist_boundaries is None:
+        hist_boundaries = [np.percentile(stack, p) for p in hist_percentiles]
     stack = stack - hist_boundaries[0]
     stack = (stack / hist_boundaries[1]) * 255
     stack[stack < 0] = 0
@@ -92,6 +255,11 @@ def color_stack(
     alpha=0.9,
     invert_anatomy=True,
     hist_percentiles=None,
+    output="rgba",
+    outline=False,
+    outline_width=1,
+    outline_color=None,
+    cyclic_a=True,
 ):
     """
     Parameters
@@ -99,12 +267,14 @@ def color_stack(
     rois : 3D np.array
         stack of ROIs (fimpy convention: -1 in empty voxels)
 
-    variable : 1D np.array
+    variable : 1D np.array or tuple of two 1D np.arrays
         An array of length==n_rois based on which colors stack will be colored.
         If it contains integers, we'll assume the variable is categorical
         unless specified otherwise with the `categorical` parameter.
         ROIs can be excluded from the coloring by setting their value to -1
         (for categorical variables) or to np.nan (for non categorical variables).
+        If a tuple of two arrays is passed, ROIs are colored from both with a 2D
+        lookup table (see `get_bivariate_colors`).
 
     categorical : bool (optional)
         If true, variable will be treated as categorical (normally inferred
@@ -117,6 +287,8 @@ def color_stack(
                 generated.
             - non categorical: string specifying a matplotlib color palette.
                 By default, viridis will be used.
+            - bivariate: (n_a, n_b, 4) lookup table. By default, the one from
+                `get_bivariate_lut` will be used.
 
     anatomy : 3D numpy array (optional)
         If specified, ROIs will be overimposed on it, with tht specified the `alpha`
@@ -125,7 +297,8 @@ def color_stack(
         Filling for the empty voxels. Default options are "w", "k" and "transparent".
 
     vlims : tuple or list (optional)
-        Limits for the colormap (used only for non-categorical variable).
+        Limits for the colormap (used only for non-categorical variable). For
+        bivariate coloring, a tuple with the limits of each variable.
 
     lum : int (optional)
         Luminance for the generation of the categories colors, from 0 to 100
@@ -150,8 +323,38 @@ def color_stack(
         Range used for the normalization of the anatomy histogram, if anatomy is not
         already scaled. Default (5, 99)
 
+    output : str (optional)
+        Either "rgba", for a stack of colors, or "indexed", for a compact stack of
+        palette indexes with one entry per ROI (index i + 1 for ROI i), that can be
+        recolored with a new per-ROI variable by changing the palette. ROIs
+        excluded from the coloring are indexed as background. Not available with
+        anatomy. Default "rgba".
+
+    outline : bool (optional)
+        If True, ROI outlines are drawn in the output, detecting the ROI boundaries
+        within each plane. Default False.
+
+    outline_width : int (optional)
+        Width of the ROI outlines, in voxels. Default 1.
+
+    outline_color : color (optional)
+        If None, only the outlines of the ROIs are colored, with the ROI colors.
+        Otherwise, outlines are painted with this color over the colored ROIs.
+        Default None.
+
+    cyclic_a : bool (optional)
+        For bivariate coloring, if True the first variable is cyclic (eg, a phase),
+        and values out of its limits wrap around (see `get_bivariate_colors`).
+        Default True.
+
     Returns
     -------
+    np.array or IndexedStack
+        (rois.shape + (4,)) uint8 stack of colors ((rois.shape + (3,)) with
+        anatomy), or, for indexed output, a named tuple with the unsigned integer
+        stack of indexes, the (n_rois + 1, 4) palette (plus a last entry for the
+        outline color, if passed) and a colormap and norm to show the
+        indexes with plt.imshow.
 
     """
 
@@ -171,20 +374,35 @@ def color_stack(
         ),
     )
 
+    bivariate = isinstance(variable, tuple)
+
     # We infer if the variable is categorical or not:
     if categorical is None:
-        categorical = np.issubdtype(np.array(variable).dtype, np.integer)
+        categorical = not bivariate and np.issubdtype(
+            np.array(variable).dtype, np.integer
+        )
+
+    if bivariate:
+        variable_a, variable_b = (np.asarray(v, dtype=float) for v in variable)
+        excluded = np.isnan(variable_a) | np.isnan(variable_b)
+        if excluded.any():
+            rois = _exclude_rois(rois, excluded)
+        # get roi colors:
+        vlims_a, vlims_b = (None, None) if vlims is None else vlims
+        roi_colors = get_bivariate_colors(
+            variable_a,
+            variable_b,
+            color_scheme=color_scheme,
+            vlims_a=vlims_a,
+            vlims_b=vlims_b,
+            cyclic_a=cyclic_a,
+        )
 
-    if categorical:
-        # Esclude from the stack rois with nan variable, using the filling function
+    elif categorical:
+        # Esclude from the stack rois with negative variable:
         # TODO refactor together this and the non categorical condition
         if (variable < 0).any():
-            print("excluding")
-            nan_filling = np.arange(rois.max() + 1)[:, np.newaxis]
-            nan_filling[np.argwhere(variable < 0)[:, 0], :] = -1
-            rois = _fill_roi_stack(rois, nan_filling, background=np.array([[-1]]))[
-                :, :, :, 0
-            ]
+            rois = _exclude_rois(rois, variable < 0)
 
         # get roi colors:
         roi_colors = _get_categorical_colors(
@@ -192,13 +410,9 @@ def color_stack(
         )
 
     else:
-        # Esclude from the stack rois with nan variable, using the filling function:
+        # Esclude from the stack rois with nan variable:
         if np.isnan(variable).any():
-            nan_filling = np.arange(rois.max() + 1)[:, np.newaxis]
-            nan_filling[np.argwhere(np.isnan(variable))[:, 0], :] = -1
-            rois = _fill_roi_stack(rois, nan_filling, background=np.array([[-1]]))[
-                :, :, :, 0
-            ]
+            rois = _exclude_rois(rois, np.isnan(variable))
         # get roi colors:
         roi_colors = get_continuous_colors(
             variable, color_scheme=color_scheme, vlims=vlims
@@ -207,8 +421,26 @@ def color_stack(
     if isinstance(background, str):
         background = BACKGROUNDS[background]
 
+    if outline:
+        boundaries = _label_boundaries(rois, width=outline_width)
+        if outline_color is None:
+            rois = np.where(boundaries, rois, -1)
+
+    if output == "indexed":
+        if anatomy is not None:
+            raise ValueError("Indexed output is not available with anatomy!")
+        if outline and outline_color is not None:
+            # The outline color is added as an extra color of the palette:
+            roi_colors = np.concatenate(
+                [roi_colors, _outline_color(outline_color, 4)[np.newaxis, :]]
+            )
+            rois = np.where(boundaries, len(roi_colors) - 1, rois)
+        return _index_roi_stack(rois, roi_colors, background)
+    elif output != "rgba":
+        raise ValueError("'output' should be either rgba or indexed!")
+
     if anatomy is None:
-        return _fill_roi_stack(rois, roi_colors, background=background)
+        colored = _fill_roi_stack(rois, roi_colors, background=background)
     else:
         # If required, normalize the anatomy stack:
         if hist_percentiles is not None or anatomy.max() > 255 or anatomy.min() < 0:
@@ -217,7 +449,7 @@ def color_stack(
 
             anatomy = _normalize_to_255(anatomy, hist_percentiles=hist_percentiles)
 
-        return _color_anatomy_rgb(
+        colored = _color_anatomy_rgb(
             rois,
             roi_colors[:, :3],
             anatomy.astype(np.uint8),
@@ -225,8 +457,43 @@ def color_stack(
             invert_anatomy=invert_anatomy,
         )
 
+    if outline and outline_color is not None:
+        colored[boundaries] = _outline_color(outline_color, colored.shape[-1])
+
+    return colored
+
 
-def color_zproject(stack, mode="overlay"):
+def color_zproject(
+    stack, mode="overlay", outline=False, outline_width=1, outline_color=None
+):
+    """Project a colored stack along the first axis.
+
+    Parameters
+    ----------
+    stack : 4D np.array
+        Colored stack, eg from `color_stack`.
+
+    mode : str (optional)
+        Either "overlay" (each pixel takes the color of the last non-empty plane)
+        or "transparency" (colors of all planes are summed). Default "overlay".
+
+    outline : bool (optional)
+        If True, outlines of the regions of uniform color of the projection are
+        drawn. Default False.
+
+    outline_width : int (optional)
+        Width of the outlines, in pixels. Default 1.
+
+    outline_color : color (optional)
+        If None, only the outlines are kept, with the region colors. Otherwise,
+        outlines are painted with this color over the projection. Default None.
+
+    Returns
+    -------
+    np.array
+        3D uint8 projected image.
+
+    """
     if mode == "overlay":
         projected = np.zeros(stack.shape[1:], dtype=np.uint8)
         for plane in range(stack.shape[0]):
@@ -244,4 +511,17 @@ def color_zproject(stack, mode="overlay"):
     else:
         raise ValueError("'mode' should be either overlay or transparency!")
 
+    if outline:
+        # Use colors as labels, packing the channels in a single integer:
+        labels = np.zeros(projected.shape[:-1], dtype=np.int64)
+        for channel in range(projected.shape[-1]):
+            labels = (labels << 8) | projected[..., channel]
+        labels[(projected == 0).all(-1)] = -1
+
+        boundaries = _label_boundaries(labels, width=outline_width)
+        if outline_color is None:
+            projected[~boundaries] = 0
+        else:
+            projected[boundaries] = _outline_color(outline_color, projected.shape[-1])
+
     return projected
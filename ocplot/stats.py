@@ -0,0 +1,205 @@
+"""Vectorized resampling statistics (bootstrap confidence intervals and permutation
+tests) for groups of data, in a format ready for plotting and labelling.
+"""
+
+from itertools import combinations, islice
+from math import factorial
+
+import numpy as np
+import pandas as pd
+
+from ocplot.labels import get_pval_stars
+
+
+def _get_groups(data):
+    """Dictionary of group name: array without nans from a dataframe (one group
+    per column), a dictionary or a list of arrays."""
+    if isinstance(data, pd.DataFrame):
+        data = {col: data[col].values for col in data.columns}
+    elif not isinstance(data, dict):
+        data = dict(enumerate(data))
+
+    groups = {}
+    for key, values in data.items():
+        values = np.asarray(values, dtype=float)
+        groups[key] = values[~np.isnan(values)]
+    return groups
+
+
+def _get_statistic(statistic):
+    if callable(statistic):
+        return statistic
+    return dict(mean=np.mean, median=np.median)[statistic]
+
+
+def _batch_sizes(n_resamples, n_values, max_memory):
+    """Split resamples in batches so that (batch, n_values) index and value
+    matrices stay below max_memory bytes."""
+    batch_size = max(int(max_memory // (n_values * 16)), 1)
+    n_full, last = divmod(n_resamples, batch_size)
+    return [batch_size] * n_full + ([last] if last > 0 else [])
+
+
+def bootstrap_ci(
+    data, statistic="mean", n_boot=10000, ci=95, seed=None, max_memory=1e8
+):
+    """Bootstrap confidence intervals of a statistic for each group.
+
+    Parameters
+    ----------
+    data : pd.DataFrame, dict or list of arrays
+        Groups of data: one group per column of a dataframe (as in
+        `tick_with_bars`), or per entry of a dictionary or list. Nans are dropped.
+    statistic : str or function (optional)
+        Either "mean", "median" or a function accepting an `axis` argument
+        (default="mean").
+    n_boot : int (optional)
+        Number of bootstrap resamples (default=10000).
+    ci : float (optional)
+        Confidence interval width, in percent (default=95).
+    seed : int or np.random.Generator (optional)
+        Seed of the random generator, for reproducible results (default=None).
+    max_memory : float (optional)
+        Maximum memory, in bytes, used by each batch of resamples (default=1e8).
+
+    Returns
+    -------
+    pd.DataFrame
+        Dataframe indexed by group, with the statistic and the ci_low and ci_high
+        bounds of the confidence interval (nan for empty groups).
+
+    """
+    rng = np.random.default_rng(seed)
+    stat_fun = _get_statistic(statistic)
+
+    results = []
+    for key, values in _get_groups(data).items():
+        if len(values) == 0:
+            results.append(
+                dict(group=key, statistic=np.nan, ci_low=np.nan, ci_high=np.nan)
+            )
+            continue
+
+        boot_stats = np.concatenate(
+            [
+                stat_fun(values[rng.integers(0, len(values), (n, len(values)))], axis=1)
+                for n in _batch_sizes(n_boot, len(values), max_memory)
+            ]
+        )
+        ci_low, ci_high = np.percentile(boot_stats, [(100 - ci) / 2, (100 + ci) / 2])
+        results.append(
+            dict(
+                group=key,
+                statistic=stat_fun(values),
+                ci_low=ci_low,
+                ci_high=ci_high,
+            )
+        )
+
+    return pd.DataFrame(results).set_index("group")
+
+
+def _n_splits(n_values, n_a):
+    """Number of ways of splitting n_values values in groups of n_a and the rest."""
+    return factorial(n_values) // (factorial(n_a) * factorial(n_values - n_a))
+
+
+def _split_orders(n_values, n_a, n, rng, splits=None):
+    """(n, n_values) orders of the pooled values, with the first n_a values in
+    the first group: either the next n exact splits, or n random permutations."""
+    if splits is None:
+        return np.argsort(rng.random((n, n_values)), axis=1)
+
+    in_a = np.zeros((n, n_values), dtype=bool)
+    in_a[np.arange(n)[:, np.newaxis], np.array(list(islice(splits, n)))] = True
+    return np.argsort(~in_a, axis=1, kind="stable")
+
+
+def permutation_tests(
+    data, statistic="mean", n_perm=10000, pairs=None, seed=None, max_memory=1e8
+):
+    """Two-sided permutation tests for the difference of a statistic between pairs
+    of groups. When n_perm is larger than the number of possible splits of the
+    pooled values, all of them are tested (exact test). P-values follow the
+    convention of scipy.stats.permutation_test.
+
+    Parameters
+    ----------
+    data : pd.DataFrame, dict or list of arrays
+        Groups of data: one group per column of a dataframe (as in
+        `tick_with_bars`), or per entry of a dictionary or list. Nans are dropped.
+    statistic : str or function (optional)
+        Either "mean", "median" or a function accepting an `axis` argument
+        (default="mean").
+    n_perm : int (optional)
+        Number of permutations (default=10000).
+    pairs : list of tuples (optional)
+        Pairs of groups to test (default=all pairs).
+    seed : int or np.random.Generator (optional)
+        Seed of the random generator, for reproducible results (default=None).
+    max_memory : float (optional)
+        Maximum memory, in bytes, used by each batch of permutations (default=1e8).
+
+    Returns
+    -------
+    pd.DataFrame
+        Dataframe with one row per pair, with the groups, their positions (as
+        x positions in `tick_with_bars`), the difference of the statistic, the
+        pvalue (nan if a group is empty) and the corresponding stars from
+        `get_pval_stars`.
+
+    """
+    rng = np.random.default_rng(seed)
+    stat_fun = _get_statistic(statistic)
+    groups = _get_groups(data)
+    keys = list(groups.keys())
+    if pairs is None:
+        pairs = list(combinations(keys, 2))
+
+    results = []
+    for key_a, key_b in pairs:
+        values_a, values_b = groups[key_a], groups[key_b]
+        pooled = np.concatenate([values_a, values_b])
+        n_a = len(values_a)
+
+        if n_a == 0 or len(values_b) == 0:
+            difference, pvalue = np.nan, np.nan
+        else:
+            difference = stat_fun(values_a) - stat_fun(values_b)
+            # Tolerance on the comparisons, as in scipy:
+            gamma = np.abs(1e-14 * difference)
+
+            n_splits = _n_splits(len(pooled), n_a)
+            exact = n_perm >= n_splits
+            splits = combinations(range(len(pooled)), n_a) if exact else None
+            n_tested = n_splits if exact else n_perm
+
+            n_less, n_greater = 0, 0
+            for n in _batch_sizes(n_tested, len(pooled), max_memory):
+                permuted = pooled[_split_orders(len(pooled), n_a, n, rng, splits)]
+                null_differences = stat_fun(permuted[:, :n_a], axis=1) - stat_fun(
+                    permuted[:, n_a:], axis=1
+                )
+                n_less += np.sum(null_differences <= difference + gamma)
+                n_greater += np.sum(null_differences >= difference - gamma)
+
+            if exact:
+                p_less, p_greater = n_less / n_splits, n_greater / n_splits
+            else:
+                p_less = (n_less + 1) / (n_perm + 1)
+                p_greater = (n_greater + 1) / (n_perm + 1)
+            pvalue = min(2 * min(p_less, p_greater), 1)
+
+        results.append(
+            dict(
+                group_a=key_a,
+                group_b=key_b,
+                x_a=keys.index(key_a),
+                x_b=keys.index(key_b),
+                difference=difference,
+                pvalue=pvalue,
+                stars=get_pval_stars(pvalue),
+            )
+        )
+
+    return pd.DataFrame(results)
@@ -0,0 +1,163 @@
+"""Live plotting of colored trajectories, for data streamed in chunks."""
+
+import numpy as np
+from matplotlib import colors
+from matplotlib import pyplot as plt
+from matplotlib.collections import LineCollection
+
+from ocplot.handles import ArtistHandle
+
+
+class StreamingColorPlot(ArtistHandle):
+    """Colored line plot (as in `color_plot`) of the last `n_samples` of a stream of
+    data. Samples are kept in a fixed-size ring buffer and the line is updated in
+    place, so that the cost of an update does not grow with the stream length.
+
+    Axes limits are not updated with new data, so they should be set in advance.
+    If the canvas supports it, the figure is fully drawn only on the first update,
+    and then only the line is redrawn over the cached background (blitting). As
+    the line is then an animated artist, it is not included by savefig.
+
+    Parameters
+    ----------
+    n_samples : int
+        Number of samples kept in the buffer and shown.
+    ax : plt.Axes
+        Axes on which to plot (default=current).
+    vlims : 2 elements tuple
+        Color limits. If no color variable is passed when appending data, samples
+        are colored by their position in the buffer, from 0 (oldest) to 1
+        (default=(0, 1)).
+    cmap : str
+        Name of the matplotlib colormap to use (default="twilight").
+    blit : bool
+        If True, the line is redrawn with blitting at every update (default=True).
+    kwargs : dict
+        Additional arguments for the LineCollection (eg, lw, alpha, zorder).
+
+    """
+
+    def __init__(
+        self, n_samples, ax=None, vlims=(0, 1), cmap="twilight", blit=True, **kwargs
+    ):
+        if ax is None:
+            ax = plt.gca()
+
+        kwargs.setdefault("capstyle", "round")
+        lines = LineCollection(
+            np.zeros((0, 2, 2)),
+            cmap=plt.get_cmap(cmap),
+            norm=colors.Normalize(vmin=vlims[0], vmax=vlims[1]),
+            animated=blit,
+            **kwargs,
+        )
+        ax.add_collection(lines, autolim=False)
+        super().__init__([lines])
+
+        self.buffer = np.full((n_samples, 3), np.nan)
+        self.n_appended = 0
+        self.blit = blit
+
+        self._background = None
+        if blit:
+            self._draw_cid = ax.figure.canvas.mpl_connect("draw_event", self._on_draw)
+
+    def _on_draw(self, event):
+        """On full redraws, cache the background and draw the line over it."""
+        # Draws for savefig (eg, to other formats or dpi) are not valid
+        # backgrounds for blitting:
+        canvas = event.canvas
+        if (
+            canvas is not self.artist.figure.canvas
+            or not getattr(canvas, "supports_blit", False)
+            or canvas.is_saving()
+        ):
+            return
+        self._background = canvas.copy_from_bbox(self.artist.axes.bbox)
+        self.artist.axes.draw_artist(self.artist)
+
+    def get_data(self):
+        """Samples in the buffer, from the oldest to the newest.
+
+        Returns
+        -------
+        np.array
+            (n, 3) array of x, y and color variable (nan if not passed).
+
+        """
+        n_samples = len(self.buffer)
+        if self.n_appended < n_samples:
+            return self.buffer[: self.n_appended]
+        return np.roll(self.buffer, -(self.n_appended % n_samples), axis=0)
+
+    def append(self, x, y, c=None):
+        """Append a chunk of samples and update the plot.
+
+        Parameters
+        ----------
+        x : np.array
+            X of the new samples.
+        y : np.array
+            Y of the new samples.
+        c : np.array (optional)
+            Color variable of the new samples (default=position in the buffer).
+
+        Returns
+        -------
+        list of matplotlib artists
+            Updated artists.
+
+        """
+        chunk = np.stack(
+            [
+                np.atleast_1d(x),
+                np.atleast_1d(y),
+                np.full(np.size(x), np.nan) if c is None else np.atleast_1d(c),
+            ],
+            1,
+        )
+        n_samples = len(self.buffer)
+
+        # Samples older than the buffer length would be overwritten anyway:
+        n_skipped = max(len(chunk) - n_samples, 0)
+        positions = (self.n_appended + np.arange(n_skipped, len(chunk))) % n_samples
+        self.buffer[positions] = chunk[n_skipped:]
+        self.n_appended += len(chunk)
+
+        self._update_line()
+        self.redraw()
+
+        return self.artists
+
+    def _update(self, x, y, c=None):
+        self.append(x, y, c)
+
+    def _update_line(self):
+        data = self.get_data()
+        self.artist.set_segments(np.stack([data[:-1, :2], data[1:, :2]], 1))
+        if np.isnan(data[1:, 2]).all():
+            self.artist.set_array(np.linspace(0, 1, max(len(data) - 1, 0)))
+        else:
+            self.artist.set_array(data[1:, 2])
+
+    def redraw(self):
+        """Redraw the line, only over the cached background if blitting."""
+        canvas = self.artist.figure.canvas
+        if not self.blit or not getattr(canvas, "supports_blit", False):
+            canvas.draw_idle()
+            return
+
+        if self._background is None:
+            canvas.draw()  # caches the background through the draw_event
+        else:
+            canvas.restore_region(self._background)
+            self.artist.axes.draw_artist(self.artist)
+        canvas.blit(self.artist.axes.bbox)
+        canvas.flush_events()
+
+    def clear(self):
+        """Empty the buffer."""
+        self.buffer[:] = np.nan
+        self.n_appended = 0
+        self._update_line()
+        self.redraw()
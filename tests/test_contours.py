@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from ocplot.contours import decimate_mesh, label_meshes, mask_mesh
+
+
+@pytest.fixture
+def mask():
+    z, y, x = np.mgrid[:30, :40, :40]
+    return ((z - 15) / 10) ** 2 + ((y - 22) / 12) ** 2 + ((x - 18) / 11) ** 2 < 1
+
+
+def test_decimate_mesh(mask):
+    verts, faces = mask_mesh(mask, smooth_iter=0)
+    decimated_verts, decimated_faces = decimate_mesh(verts, faces, 300)
+
+    assert 0 < len(decimated_faces) <= 300
+    assert decimated_faces.min() >= 0
+    assert decimated_faces.max() < len(decimated_verts)
+    # All vertices are used:
+    assert len(np.unique(decimated_faces)) == len(decimated_verts)
+
+
+def test_mask_mesh_n_faces(mask):
+    verts, faces = mask_mesh(mask, step=2, n_faces=200)
+    assert 0 < len(faces) <= 200
+    assert faces.max() < len(verts)
+
+
+def test_mask_mesh_crop(mask):
+    verts_cropped, faces_cropped = mask_mesh(mask, crop=True)
+    verts, faces = mask_mesh(mask, crop=False)
+
+    np.testing.assert_allclose(verts_cropped, verts)
+    np.testing.assert_array_equal(faces_cropped, faces)
+    # Vertices are in the coordinates of the full mask:
+    np.testing.assert_allclose(verts.min(0), [5, 10, 7], atol=1)
+
+
+def test_mask_mesh_cache(mask, tmp_path):
+    verts, faces = mask_mesh(mask, n_faces=500, cache_dir=tmp_path)
+    assert len(list(tmp_path.glob("*.npz"))) == 1
+
+    cached_verts, cached_faces = mask_mesh(mask, n_faces=500, cache_dir=tmp_path)
+    np.testing.assert_array_equal(cached_verts, verts)
+    np.testing.assert_array_equal(cached_faces, faces)
+
+    # Different parameters are cached separately:
+    mask_mesh(mask, n_faces=400, cache_dir=tmp_path)
+    assert len(list(tmp_path.glob("*.npz"))) == 2
+
+
+def test_empty_mask():
+    verts, faces = mask_mesh(np.zeros((5, 5, 5), dtype=bool))
+    assert verts.shape == (0, 3)
+    assert faces.shape == (0, 3)
+
+
+def test_label_meshes(mask):
+    labels = np.full(mask.shape, -1)
+    labels[mask] = 0
+    labels[:5, :5, :5] = 2
+
+    meshes = label_meshes(labels, n_faces=300)
+    assert sorted(meshes.keys()) == [0, 2]
+    verts, faces = meshes[0]
+    assert len(faces) <= 300
+    np.testing.assert_allclose(verts.min(0), mask_mesh(mask)[0].min(0), atol=1)
+
+    assert list(label_meshes(labels, label_ids=[2, 5]).keys()) == [2]
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from ocplot.export import export_colored_stack
+from ocplot.stack_coloring import color_stack
+
+
+@pytest.fixture
+def rois():
+    return np.random.default_rng(0).integers(-1, 30, (10, 20, 20))
+
+
+@pytest.fixture
+def variable():
+    return np.random.default_rng(1).random(30)
+
+
+def _read(filename):
+    if filename.suffix == ".zarr":
+        zarr = pytest.importorskip("zarr")
+        return np.moveaxis(zarr.open_group(str(filename), mode="r")["0"][:], 0, -1)
+    return pytest.importorskip("tifffile").imread(filename)
+
+
+@pytest.mark.parametrize("suffix", [".zarr", ".tif"])
+@pytest.mark.parametrize("with_anatomy", [False, True])
+def test_export_matches_color_stack(rois, variable, tmp_path, suffix, with_anatomy):
+    pytest.importorskip("zarr" if suffix == ".zarr" else "tifffile")
+    anatomy = None
+    if with_anatomy:
+        anatomy = np.random.default_rng(2).integers(0, 255, rois.shape)
+
+    filename = export_colored_stack(
+        tmp_path / f"stack{suffix}",
+        rois,
+        variable,
+        anatomy=anatomy,
+        block_size=3,
+        n_threads=2,
+    )
+
+    np.testing.assert_array_equal(
+        _read(filename), color_stack(rois, variable, anatomy=anatomy)
+    )
+
+
+def test_export_indexed_fails(rois, variable, tmp_path):
+    with pytest.raises(ValueError):
+        export_colored_stack(tmp_path / "stack.tif", rois, variable, output="indexed")
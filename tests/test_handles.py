@@ -0,0 +1,11 @@
+import pytest
+
+from ocplot.handles import ArtistHandle
+
+
+def test_handle_without_update_fails():
+    class IncompleteHandle(ArtistHandle):
+        pass
+
+    with pytest.raises(TypeError):
+        IncompleteHandle([])
@@ -0,0 +1,59 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ocplot.batch import new_figure
+from ocplot.plotting import _density_image, color_plot, tick_with_bars
+
+# A trace on a row of 3 pixels: the segment 0-1 has value 2, the segment 1-2
+# value 3, and a nan gap breaks the trace before the segment 3-4:
+X = [0, 1, 2, np.nan, 0, 1]
+Y = [0, 0, 0, np.nan, 0, 0]
+C = [1, 2, 3, np.nan, 10, 20]
+
+
+@pytest.mark.parametrize(
+    "agg, expected",
+    [("count", [2, 3, 1]), ("mean", [22 / 2, 25 / 3, 3]), ("last", [20, 20, 3])],
+)
+def test_density_image(agg, expected):
+    img, extent = _density_image(X, Y, C, (1, 3), agg=agg)
+    np.testing.assert_allclose(img, [expected])
+    np.testing.assert_allclose(extent[:2], [-0.5, 2.5])
+
+
+def test_density_image_empty_pixels():
+    img, _ = _density_image([0, 1, np.nan, 4], [0, 0, 0, 0], [1, 1, 1, 1], (1, 5))
+    np.testing.assert_array_equal(np.isnan(img[0]), [False] * 2 + [True] * 3)
+
+
+def test_color_plot_density_nan_colors():
+    ax = new_figure().add_subplot()
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        handle = color_plot(
+            np.arange(10.0),
+            np.arange(10.0),
+            c=np.full(10, np.nan),
+            ax=ax,
+            mode="density",
+            resolution=(10, 10),
+        )
+    assert handle.artist.get_clim() == (0, 1)
+
+
+def test_tick_with_bars_seed():
+    df = pd.DataFrame(np.random.default_rng(0).normal(size=(20, 3)))
+
+    def _bars(seed):
+        ax = new_figure().add_subplot()
+        handle = tick_with_bars(
+            df, ax=ax, cols="rgb", moment="bootstrap", xdisperse=True, seed=seed
+        )
+        return [line.get_xydata() for line in handle.artists]
+
+    for bars, same_bars in zip(_bars(3), _bars(3)):
+        np.testing.assert_array_equal(bars, same_bars)
+    assert any((a != b).any() for a, b in zip(_bars(3), _bars(4)))
@@ -0,0 +1,145 @@
+import numpy as np
+import pytest
+
+from ocplot.color_utils import get_continuous_colors
+from ocplot.stack_coloring import (
+    COLOR_DTYPES,
+    LABEL_DTYPES,
+    _fill_roi_stack,
+    _fill_roi_stack_jit,
+    _fill_roi_stack_numpy,
+    _label_boundaries,
+    color_stack,
+    color_zproject,
+    warmup_kernels,
+)
+
+
+@pytest.fixture
+def rois():
+    return np.random.default_rng(0).integers(-1, 50, (10, 30, 30))
+
+
+@pytest.mark.parametrize("label_dtype", LABEL_DTYPES)
+@pytest.mark.parametrize("color_dtype", COLOR_DTYPES)
+def test_fill_roi_stack(rois, label_dtype, color_dtype):
+    rois = rois.astype(label_dtype)
+    roi_colors = np.random.default_rng(1).integers(0, 255, (50, 4)).astype(color_dtype)
+    background = np.array([1, 2, 3, 4], dtype=color_dtype)
+
+    filled = _fill_roi_stack(rois, roi_colors, background)
+    assert filled.dtype == color_dtype
+    np.testing.assert_array_equal(
+        filled, _fill_roi_stack_numpy(rois, roi_colors, background)
+    )
+
+
+def test_color_stack_readonly(rois, tmp_path):
+    variable = np.random.default_rng(1).random(50)
+    np.save(tmp_path / "rois.npy", rois)
+    mapped = np.load(tmp_path / "rois.npy", mmap_mode="r")
+
+    np.testing.assert_array_equal(
+        color_stack(mapped, variable), color_stack(rois, variable)
+    )
+
+
+def test_no_compilation_after_warmup(rois):
+    if _fill_roi_stack_jit is None:
+        pytest.skip("numba not available")
+
+    warmup_kernels(readonly=True)
+    signatures = list(_fill_roi_stack_jit.signatures)
+    for label_dtype in LABEL_DTYPES:
+        label_rois = rois.astype(label_dtype)
+        color_stack(label_rois, np.arange(50) % 5)
+        color_stack(label_rois, np.random.default_rng(1).random(50))
+        label_rois.setflags(write=False)
+        color_stack(label_rois, np.arange(50) % 5)
+
+    assert _fill_roi_stack_jit.signatures == signatures
+
+
+def _from_drawing(drawing):
+    """Boolean plane from a drawing, True on "x"."""
+    return np.array([[c == "x" for c in row] for row in drawing.split()])
+
+
+@pytest.fixture
+def touching_rois():
+    """A plane with two touching 6x5 ROIs."""
+    plane = np.full((8, 12), -1)
+    plane[1:7, 1:6] = 0
+    plane[1:7, 6:11] = 1
+    return plane[np.newaxis]
+
+
+def test_label_boundaries(touching_rois):
+    width_1 = """
+        ............
+        .xxxxxxxxxx.
+        .x...xx...x.
+        .x...xx...x.
+        .x...xx...x.
+        .x...xx...x.
+        .xxxxxxxxxx.
+        ............
+    """
+    width_2 = """
+        ............
+        .xxxxxxxxxx.
+        .xxxxxxxxxx.
+        .xx.xxxx.xx.
+        .xx.xxxx.xx.
+        .xxxxxxxxxx.
+        .xxxxxxxxxx.
+        ............
+    """
+    np.testing.assert_array_equal(
+        _label_boundaries(touching_rois, width=1)[0], _from_drawing(width_1)
+    )
+    np.testing.assert_array_equal(
+        _label_boundaries(touching_rois, width=2)[0], _from_drawing(width_2)
+    )
+
+
+def test_outlines(touching_rois):
+    boundaries = _label_boundaries(touching_rois)
+    variable = np.array([0, 1])
+
+    outlined = color_stack(touching_rois, variable, outline=True)
+    assert ((outlined[..., 3] > 0) == boundaries).all()
+
+    projected = color_zproject(color_stack(touching_rois, variable), outline=True)
+    assert ((projected[..., 3] > 0) == boundaries[0]).all()
+
+
+def test_outline_color_over_anatomy(touching_rois):
+    variable = np.array([0, 1])
+    anatomy = np.random.default_rng(0).integers(0, 255, touching_rois.shape)
+    boundaries = _label_boundaries(touching_rois)
+
+    colored = color_stack(touching_rois, variable, anatomy=anatomy)
+    outlined = color_stack(
+        touching_rois, variable, anatomy=anatomy, outline=True, outline_color="r"
+    )
+    assert (outlined[boundaries] == [255, 0, 0]).all()
+    np.testing.assert_array_equal(outlined[~boundaries], colored[~boundaries])
+
+
+def test_indexed_output(rois):
+    rng = np.random.default_rng(1)
+    variable, new_variable = rng.random(50), rng.random(50)
+    variable[3] = np.nan
+
+    indexed = color_stack(rois, variable, output="indexed")
+    np.testing.assert_array_equal(
+        indexed.palette[indexed.indexes], color_stack(rois, variable)
+    )
+
+    # Recolor with a new variable by changing the palette only:
+    palette = indexed.palette.copy()
+    palette[1:] = get_continuous_colors(new_variable)
+    np.testing.assert_array_equal(
+        palette[indexed.indexes][rois != 3], color_stack(rois, new_variable)[rois != 3]
+    )
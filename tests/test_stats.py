@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from ocplot.stats import bootstrap_ci, permutation_tests
+
+
+def _mean_difference(x, y, axis):
+    return np.mean(x, axis=axis) - np.mean(y, axis=axis)
+
+
+# 126 possible splits of 5 and 4 values (exact test), 11440 of 7 and 9:
+@pytest.mark.parametrize("n_a, n_b, exact", [(5, 4, True), (7, 9, False)])
+def test_permutation_tests_match_scipy(n_a, n_b, exact):
+    rng = np.random.default_rng(0)
+    values_a, values_b = rng.normal(0.2, 1, n_a), rng.normal(0, 1, n_b)
+
+    result = permutation_tests([values_a, values_b], n_perm=5000, seed=1)
+    expected = stats.permutation_test(
+        (values_a, values_b),
+        _mean_difference,
+        n_resamples=5000,
+        vectorized=True,
+        random_state=1,
+    )
+
+    assert result.loc[0, "difference"] == pytest.approx(expected.statistic)
+    if exact:
+        assert result.loc[0, "pvalue"] == pytest.approx(expected.pvalue)
+    else:
+        assert result.loc[0, "pvalue"] == pytest.approx(expected.pvalue, abs=0.03)
+
+
+def test_empty_groups():
+    df = pd.DataFrame(dict(a=[1.0, 2.0, 3.0], b=[np.nan] * 3))
+
+    cis = bootstrap_ci(df, seed=0)
+    assert cis.loc["b"].isna().all()
+    assert not cis.loc["a"].isna().any()
+
+    tests = permutation_tests(df, seed=0)
+    assert np.isnan(tests.loc[0, "pvalue"])
+    assert tests.loc[0, "stars"] == "n.s."
+
+
+def test_bootstrap_ci_seed():
+    data = [np.random.default_rng(0).normal(size=20)]
+    pd.testing.assert_frame_equal(
+        bootstrap_ci(data, seed=3, n_boot=500), bootstrap_ci(data, seed=3, n_boot=500)
+    )
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from ocplot.batch import new_figure
+from ocplot.plotting import add_looming_triangles, add_stim_bar, add_stim_bars
+
+
+@pytest.fixture
+def ax():
+    ax = new_figure().add_subplot()
+    ax.set(xlim=(0, 100), ylim=(0, 1))
+    return ax
+
+
+def test_stim_bars_update(ax):
+    labels = [f"s{i}" if i % 3 else None for i in range(10)]
+    handle = add_stim_bars(
+        ax, np.arange(10) * 10, np.arange(10) * 10 + 5, labels=labels
+    )
+    assert len(handle.texts) == 6
+
+    handle.update(np.arange(10) * 10 + 1, np.arange(10) * 10 + 7)
+    assert [text.get_position()[0] for text in handle.texts] == [
+        i * 10 + 7 for i in range(10) if i % 3
+    ]
+    assert ax.get_xlim() == (0, 100)
+
+    with pytest.raises(ValueError):
+        handle.update([1, 2], [3, 4])
+
+
+def test_looming_triangles_update(ax):
+    handle = add_looming_triangles(
+        ax, [10, 50], [20, 60], labels=["a", "b"], y_pos=0.9, y_height=0.1
+    )
+    handle.update([15, 55], [25, 65], [30, 70])
+    assert [text.get_position()[0] for text in handle.texts] == [30, 70]
+
+
+def test_stim_bar_update(ax):
+    handle = add_stim_bar(ax, 10, 20, text="a")
+    handle.update(30, 40)
+    assert handle.texts[0].get_position()[0] == 40
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from ocplot.batch import new_figure
+from ocplot.streaming import StreamingColorPlot
+
+
+@pytest.fixture
+def stream():
+    fig = new_figure(figsize=(2, 2), dpi=50)
+    ax = fig.add_subplot()
+    ax.set(xlim=(0, 1), ylim=(0, 1))
+    stream = StreamingColorPlot(20, ax=ax)
+    stream.append(np.linspace(0, 1, 30), np.linspace(0, 1, 30))
+    return stream
+
+
+def test_append(stream):
+    data = stream.get_data()
+    assert data.shape == (20, 3)
+    np.testing.assert_allclose(data[:, 0], np.linspace(0, 1, 30)[-20:])
+    assert len(stream.artist.get_segments()) == 19
+
+
+@pytest.mark.parametrize("fmt", ["pdf", "svg", "png"])
+def test_savefig_keeps_background(stream, tmp_path, fmt):
+    background = stream._background
+    assert background is not None
+
+    stream.artist.figure.savefig(tmp_path / f"stream.{fmt}", dpi=100)
+    assert stream._background is background
+
+    stream.append([0.5], [0.5])